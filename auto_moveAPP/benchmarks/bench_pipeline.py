@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+振り分けパイプライン全体のベンチマーク
+合成したダウンロードフォルダ（小さなファイル・PDF・大きな動画・同名ファイル）を作り、
+ルール判定 / 一括振り分け / 監視経由の処理 をそれぞれ別プロセスで計測して JSON で出力する
+
+計測項目: files/s, MB/s, 1ファイルあたりの遅延 p50 / p99, ピークメモリ（RSS）
+
+使い方:
+    python benchmarks/bench_pipeline.py --dir /dev/shm/bench --output base.json
+    python benchmarks/bench_pipeline.py --dir D:/bench --dest E:/bench_dest --video 2 --video-mb 2048
+    python benchmarks/bench_pipeline.py --output new.json --compare base.json   （劣化があれば終了コード1）
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+MODES = ("rules", "backfill", "watcher")
+
+TINY_EXTENSIONS = ['txt', 'csv', 'json', 'png', 'jpg', 'zip', 'xlsx', 'docx', 'exe', 'log']
+
+# 劣化判定に使う項目（True: 大きいほど良い）
+COMPARE_KEYS = {'files_per_sec': True, 'mb_per_sec': True, 'p50_ms': False, 'p99_ms': False}
+
+
+def percentile(values, q):
+    """分位点（values はソート済み）"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[index]
+
+
+def peak_rss_mb():
+    """このプロセスのピークメモリ（MB、取得できなければ None）"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux は KB、macOS はバイト単位
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def write_file(path, size, header=b''):
+    """指定サイズのファイルを作成（大きなファイルはブロック単位で書き込む）"""
+    block = os.urandom(min(size, 1024 * 1024)) if size else b''
+    with open(path, 'wb') as f:
+        f.write(header)
+        remaining = size - len(header)
+        while remaining > 0:
+            n = min(remaining, len(block))
+            f.write(block[:n])
+            remaining -= n
+
+
+def generate_tree(source, dest, args):
+    """合成ダウンロードフォルダを作成してファイル一覧を返す"""
+    rng = random.Random(args.seed)
+    os.makedirs(source, exist_ok=True)
+    files = []
+
+    for i in range(args.tiny):
+        name = f"tiny_{i:05d}.{rng.choice(TINY_EXTENSIONS)}"
+        files.append((name, rng.randint(64, 4096), b''))
+    for i in range(args.pdf):
+        files.append((f"document_{i:04d}.pdf", rng.randint(100 * 1024, 2 * 1024 * 1024), b'%PDF-1.7\n'))
+    for i in range(args.video):
+        files.append((f"movie_{i:02d}.mp4", args.video_mb * 1024 * 1024, b'\x00\x00\x00\x18ftypmp42'))
+    # 移動先に同名ファイルがある（連番の名前になる）ファイル
+    collision_dir = os.path.join(dest, "PDF")
+    os.makedirs(collision_dir, exist_ok=True)
+    for i in range(args.collisions):
+        name = f"report_{i:04d}.pdf"
+        write_file(os.path.join(collision_dir, name), 1024, b'%PDF-1.7\n')
+        files.append((name, 64 * 1024, b'%PDF-1.7\n'))
+
+    # 同じ名前は1つにまとめる
+    unique = {}
+    for name, size, header in files:
+        unique.setdefault(name, (size, header))
+    for name, (size, header) in unique.items():
+        write_file(os.path.join(source, name), size, header)
+    return [(os.path.join(source, name), size) for name, (size, _) in unique.items()]
+
+
+def write_config(work, source, dest):
+    """ベンチマーク用の設定ファイルを作成"""
+    config = {
+        "watch_folder": source,
+        "rules": [
+            {"name": "PDF", "pattern": ".*\\.pdf$", "destination": os.path.join(dest, "PDF"), "action": "move"},
+            {"name": "動画", "pattern": ".*\\.(mp4|mkv|mov)$", "destination": os.path.join(dest, "Video"), "action": "move"},
+            {"name": "画像", "pattern": ".*\\.(png|jpg|jpeg|gif)$", "destination": os.path.join(dest, "Images"), "action": "move"},
+            {"name": "Office", "pattern": ".*\\.(docx|xlsx|pptx|csv)$", "destination": os.path.join(dest, "Office"), "action": "move"},
+            {"name": "その他", "pattern": ".*", "destination": os.path.join(dest, "Others"), "action": "move"},
+        ],
+        "log_level": "WARNING",
+        "logging": {"file": os.path.join(work, "bench.log")},
+        "readiness": {"stable_seconds": 0.05, "poll_interval": 0.05, "debounce_seconds": 0.05},
+        "hot_reload": False,
+        "metrics": {"enabled": False},
+    }
+    path = os.path.join(work, "config.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def result_of(files, total_bytes, elapsed, latencies):
+    """計測結果"""
+    latencies = sorted(latencies)
+    return {
+        'files': files,
+        'bytes': total_bytes,
+        'elapsed': round(elapsed, 4),
+        'files_per_sec': round(files / elapsed, 1) if elapsed > 0 else 0.0,
+        'mb_per_sec': round(total_bytes / (1024 * 1024) / elapsed, 1) if elapsed > 0 else 0.0,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_rules(files, config_file, args):
+    """ルール判定のみ（ファイル名に対する CompiledRules.find）"""
+    from file_mover.core import FileAutoMover
+
+    mover = FileAutoMover(config_file=config_file)
+    names = [os.path.basename(path) for path, _ in files] * max(1, args.rule_repeat)
+    find = mover.compiled_rules.find
+    latencies = []
+    start = time.perf_counter()
+    for name in names:
+        t = time.perf_counter()
+        find(name)
+        latencies.append(time.perf_counter() - t)
+    return result_of(len(names), 0, time.perf_counter() - start, latencies)
+
+
+def run_backfill(files, config_file, args):
+    """一括振り分け（BackfillRunner）"""
+    from file_mover.core import FileAutoMover
+    from file_mover.backfill import BackfillRunner
+
+    mover = FileAutoMover(config_file=config_file)
+    latencies = []
+    execute_rule = mover.execute_rule
+
+    def timed_execute_rule(file_path, rule):
+        t = time.perf_counter()
+        try:
+            return execute_rule(file_path, rule)
+        finally:
+            latencies.append(time.perf_counter() - t)
+
+    mover.execute_rule = timed_execute_rule
+    runner = BackfillRunner(mover, max_workers=args.workers, progress_callback=lambda message: None)
+    result = runner.run()
+    return result_of(result['done'], result['bytes'], result['elapsed'], latencies)
+
+
+def run_watcher(files, config_file, args):
+    """監視経由（作成イベント → 書き込み完了判定 → パイプライン → 移動）"""
+    from file_mover.core import FileAutoMover
+
+    mover = FileAutoMover(config_file=config_file)
+    total = len(files)
+    done = threading.Event()
+    seen = {}
+    latencies = []
+    lock = threading.Lock()
+    finish = mover.metrics.finish
+
+    # 移動の完了（I/Oスケジューラ経由なら転送の完了）で計測する
+    def timed_finish(file_path, completed=True):
+        try:
+            finish(file_path, completed)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - seen[os.fspath(file_path)])
+                if len(latencies) >= total:
+                    done.set()
+
+    mover.metrics.finish = timed_finish
+    mover.start()
+    start = time.perf_counter()
+    try:
+        for path, _ in files:
+            seen[path] = time.perf_counter()
+            mover.schedule_file(path)
+        done.wait(args.timeout)
+        elapsed = time.perf_counter() - start
+    finally:
+        mover.stop()
+    total_bytes = sum(size for _, size in files)
+    return result_of(len(latencies), total_bytes, elapsed, latencies)
+
+
+RUNNERS = {'rules': run_rules, 'backfill': run_backfill, 'watcher': run_watcher}
+
+
+def run_mode_in_subprocess(mode, args):
+    """1モードを新しいプロセスで実行（ピークメモリをモードごとに計測するため）"""
+    base = tempfile.mkdtemp(prefix=f"bench_{mode}_", dir=args.dir)
+    dest = tempfile.mkdtemp(prefix=f"bench_{mode}_dest_", dir=args.dest) if args.dest else os.path.join(base, "dest")
+    try:
+        command = [sys.executable, os.path.abspath(__file__), '--child', mode, '--work', base, '--child-dest', dest]
+        command += forward_args(args)
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{mode} の計測に失敗しました:\n{completed.stderr}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+        if args.dest:
+            shutil.rmtree(dest, ignore_errors=True)
+
+
+def forward_args(args):
+    """子プロセスに渡す生成条件"""
+    return ['--tiny', str(args.tiny), '--pdf', str(args.pdf), '--video', str(args.video),
+            '--video-mb', str(args.video_mb), '--collisions', str(args.collisions),
+            '--workers', str(args.workers), '--seed', str(args.seed),
+            '--rule-repeat', str(args.rule_repeat), '--timeout', str(args.timeout)]
+
+
+def run_child(args):
+    """子プロセス側：ファイル生成と計測（結果を1行の JSON で出力）"""
+    source = os.path.join(args.work, "Downloads")
+    files = generate_tree(source, args.child_dest, args)
+    config_file = write_config(args.work, source, args.child_dest)
+    result = RUNNERS[args.child](files, config_file, args)
+    print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+def compare(current, baseline, threshold):
+    """前回の結果と比較して表示し、劣化した項目の一覧を返す"""
+    regressions = []
+    print(f"{'mode':<10}{'metric':<15}{'baseline':>12}{'current':>12}{'change':>10}")
+    for mode, result in current['results'].items():
+        before = baseline.get('results', {}).get(mode)
+        if not before:
+            continue
+        for key, higher_is_better in COMPARE_KEYS.items():
+            old, new = before.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            mark = "  ← 劣化" if worse > threshold else ""
+            print(f"{mode:<10}{key:<15}{old:>12}{new:>12}{change:>+10.1%}{mark}")
+            if mark:
+                regressions.append(f"{mode}.{key}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="振り分けパイプラインのベンチマーク")
+    parser.add_argument('--dir', default='/dev/shm' if os.path.isdir('/dev/shm') else None,
+                        help="合成フォルダを作るディレクトリ（tmpfs または計測したいディスク）")
+    parser.add_argument('--dest', default=None, help="移動先を作るディレクトリ（別ディスクのコピー計測用）")
+    parser.add_argument('--modes', default=",".join(MODES), help="計測するモード（カンマ区切り）")
+    parser.add_argument('--tiny', type=int, default=2000, help="小さなファイルの数")
+    parser.add_argument('--pdf', type=int, default=200, help="PDFの数")
+    parser.add_argument('--video', type=int, default=1, help="大きな動画ファイルの数")
+    parser.add_argument('--video-mb', type=int, default=256, help="動画ファイルのサイズ(MB)")
+    parser.add_argument('--collisions', type=int, default=100, help="移動先と同名になるファイルの数")
+    parser.add_argument('--workers', type=int, default=4, help="一括振り分けの並列数")
+    parser.add_argument('--seed', type=int, default=1, help="乱数の種（同じ値なら同じフォルダを生成）")
+    parser.add_argument('--rule-repeat', type=int, default=20, help="ルール判定で名前一覧を繰り返す回数")
+    parser.add_argument('--timeout', type=float, default=600, help="監視経由の計測の待ち時間上限(秒)")
+    parser.add_argument('--output', default=None, help="結果を書き出す JSON ファイル")
+    parser.add_argument('--compare', default=None, help="比較する前回の結果 JSON")
+    parser.add_argument('--threshold', type=float, default=0.10, help="劣化と判定する変化率")
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--work', help=argparse.SUPPRESS)
+    parser.add_argument('--child-dest', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'dir': args.dir,
+            'dest': args.dest,
+            'params': {key: getattr(args, key) for key in
+                       ('tiny', 'pdf', 'video', 'video_mb', 'collisions', 'workers', 'seed', 'rule_repeat')},
+        },
+        'results': {},
+    }
+    for mode in modes:
+        report['results'][mode] = run_mode_in_subprocess(mode, args)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"劣化: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ルールマッチングのマイクロベンチマーク
+従来の re.match 線形走査と CompiledRules を同じ入力で比較する
+
+使い方:
+    python benchmarks/bench_rules.py --rules 300 --files 20000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from file_mover.rules import CompiledRules  # noqa: E402
+
+EXTENSIONS = ['pdf', 'jpg', 'png', 'mp4', 'zip', 'docx', 'xlsx', 'txt', 'csv', 'exe',
+              'mp3', 'wav', 'mkv', 'gz', '7z', 'pptx', 'heic', 'svg', 'json', 'xml']
+
+
+def build_rules(count, rng):
+    """拡張子ルールと名前ルールを混ぜたルール一覧を生成"""
+    rules = []
+    for i in range(count - 1):
+        if i % 3 == 0:
+            pattern = f".*report_{i:04d}.*"
+        else:
+            exts = rng.sample(EXTENSIONS, 2) + [f"x{i:04d}"]
+            pattern = ".*\\.(" + "|".join(exts) + ")$"
+        rules.append({"name": f"rule{i}", "pattern": pattern, "destination": f"dest/{i}", "action": "move"})
+    rules.append({"name": "その他のファイル", "pattern": ".*", "destination": "Others", "action": "move"})
+    return rules
+
+
+def build_names(count, rule_count, rng):
+    """テスト用ファイル名を生成"""
+    names = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.2:
+            names.append(f"report_{rng.randrange(rule_count):04d}_{i}.pdf")
+        elif kind < 0.9:
+            names.append(f"download_{i}.{rng.choice(EXTENSIONS)}")
+        else:
+            names.append(f"unknown_{i}.x{rng.randrange(rule_count * 2):04d}")
+    return names
+
+
+def legacy_find(rules, file_name):
+    """従来の FileAutoMover.match_rule と同じ線形走査"""
+    for index, rule in enumerate(rules):
+        pattern = rule.get('pattern', '')
+        if pattern and re.match(pattern, file_name, re.IGNORECASE) is not None:
+            return index
+    return None
+
+
+def measure(func, names, repeat):
+    """最良の実行時間（秒）を返す"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for name in names:
+            func(name)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ルールマッチングのベンチマーク")
+    parser.add_argument('--rules', type=int, default=300, help="ルール数")
+    parser.add_argument('--files', type=int, default=20000, help="ファイル名の数")
+    parser.add_argument('--repeat', type=int, default=3, help="計測回数")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = build_rules(args.rules, rng)
+    names = build_names(args.files, args.rules, rng)
+
+    start = time.perf_counter()
+    compiled = CompiledRules(rules)
+    compile_time = time.perf_counter() - start
+
+    # 結果が一致することを確認
+    for name in names:
+        expected = legacy_find(rules, name)
+        actual = compiled.find_index(name)
+        if expected != actual:
+            print(f"不一致: {name}: 従来={expected} コンパイル済み={actual}")
+            return 1
+
+    legacy = measure(lambda name: legacy_find(rules, name), names, args.repeat)
+    fast = measure(compiled.find_index, names, args.repeat)
+
+    print(f"ルール数: {len(rules)}  ファイル数: {len(names)}")
+    print(f"コンパイル時間:   {compile_time * 1000:.2f} ms")
+    print(f"従来(線形走査):   {legacy * 1e6 / len(names):.2f} us/file")
+    print(f"CompiledRules:    {fast * 1e6 / len(names):.2f} us/file")
+    print(f"高速化:           {legacy / fast:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+ダウンロードフォルダ自動振り分けアプリの処理コア
+GUI（tkinter / pystray）に依存しない部品をまとめたパッケージ
+"""
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""python -m file_mover でヘッドレス監視サービスを起動"""
+
+import sys
+
+from file_mover.service import main
+
+sys.exit(main())
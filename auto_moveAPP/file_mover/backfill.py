@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+既存ファイルの一括振り分け（バックフィル）
+監視開始前から監視フォルダにあるファイルを、同じルールでまとめて振り分ける
+
+使い方:
+    python -m file_mover.backfill --config config.json --workers 8
+    python -m file_mover.backfill --dry-run
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from file_mover.probe import FileProbe
+
+# 再開用の状態ファイル名（設定ファイルと同じディレクトリに作成）
+STATE_FILE_NAME = "backfill_state.txt"
+
+
+class BackfillRunner:
+    """監視フォルダの既存ファイルをワーカープールで一括振り分けする"""
+
+    def __init__(self, mover, folder=None, max_workers=None, state_file=None,
+                 progress_callback=None, progress_interval=1.0):
+        self.mover = mover
+        self.logger = mover.logger
+        # 対象フォルダ（省略時は全監視フォルダ）
+        self.folder = folder
+        self.max_workers = max(1, int(max_workers or mover.config.get('max_workers', 4)))
+        if state_file is None:
+            config_dir = os.path.dirname(os.path.abspath(mover.config_file))
+            state_file = os.path.join(config_dir, STATE_FILE_NAME)
+        self.state_file = state_file
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+
+        self._stop_event = threading.Event()
+        # run() の終了（処理中のファイルの完了を含む）
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+        self._state_handle = None
+        self._done_keys = set()
+        self._stats = {}
+        self._last_progress = 0.0
+
+    @property
+    def interrupted(self):
+        """中断されたかどうか"""
+        return self._stop_event.is_set()
+
+    def stop(self):
+        """中断（実行中のファイルは完了まで待つ。再実行すると続きから処理）"""
+        self._stop_event.set()
+
+    def wait(self, timeout=None):
+        """run() が終わるまで待つ（終わっていれば True）"""
+        return self._finished.wait(timeout)
+
+    @staticmethod
+    def _entry_key(path, st):
+        """再開判定用のキー（同名でも中身が変わっていれば別物として扱う）"""
+        return f"{path}\t{st.st_size}\t{st.st_mtime_ns}"
+
+    def _load_state(self):
+        """前回中断時の処理済みリストを読み込み"""
+        self._done_keys = set()
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                self._done_keys = {line.rstrip('\n') for line in f if line.strip()}
+            if self._done_keys:
+                self.logger.info(f"前回の続きから再開します（処理済み: {len(self._done_keys)}件）")
+
+    def _folders(self):
+        """走査するフォルダと、サブフォルダも対象にするかの一覧"""
+        if self.folder:
+            return [(self.folder, False)]
+        return [(root.path, root.recursive) for root in self.mover.watch_roots]
+
+    def _iter_files(self, folder, recursive):
+        """フォルダ内のファイルを列挙（再帰時は移動先フォルダを除く）"""
+        pending = [folder]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if recursive and self.mover.watch_roots.root_for(
+                                        os.path.join(entry.path, "_")) is not None:
+                                    pending.append(entry.path)
+                                continue
+                            if entry.is_file(follow_symlinks=False):
+                                yield entry
+                        except OSError:
+                            continue
+            except OSError as e:
+                self.logger.warning(f"フォルダを読み込めません: {directory}: {e}")
+
+    def scan(self):
+        """監視フォルダを走査し、移動先ごとにまとめた処理対象を返す
+
+        戻り値: {移動先パス: [(ファイルパス, ルール, サイズ, キー), ...]}
+        """
+        groups = {}
+        skipped = 0
+        for folder, recursive in self._folders():
+            for entry in self._iter_files(folder, recursive):
+                if self.mover.readiness.is_partial(entry.name):
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                key = self._entry_key(entry.path, st)
+                if key in self._done_keys:
+                    skipped += 1
+                    continue
+
+                # フォルダごとのルール（--folder で監視外を指定した場合は既定のルール）
+                compiled = self.mover.watch_roots.rules_for(entry.path) or self.mover.compiled_rules
+                rule = compiled.find(entry.name, FileProbe(entry.path, self.mover.signature_cache, st))
+                if rule is None:
+                    continue
+                dest_path = self.mover.resolve_destination(rule)
+                if dest_path is None:
+                    continue
+                groups.setdefault(dest_path, []).append((Path(entry.path), rule, st.st_size, key))
+
+        self._stats['skipped'] = skipped
+        return groups
+
+    def run(self, dry_run=False):
+        """一括振り分けを実行して結果（件数・スループット）を返す
+
+        開始前に stop() された場合は何も移動せずに終了する。
+        """
+        self._finished.clear()
+        try:
+            return self._run(dry_run)
+        finally:
+            self._finished.set()
+
+    def _run(self, dry_run):
+        # 監視を停止した後に実行した場合も移動ジャーナル・重複索引を使う
+        self.mover.open_stores()
+        self._load_state()
+        self._stats = {'total': 0, 'done': 0, 'moved': 0, 'failed': 0, 'skipped': 0, 'bytes': 0}
+
+        start = time.perf_counter()
+        groups = self.scan()
+        self._stats['total'] = sum(len(jobs) for jobs in groups.values())
+        folders = ", ".join(folder for folder, _ in self._folders())
+        self.logger.info(f"一括振り分け開始: {folders}（{self._stats['total']}件 / 移動先{len(groups)}箇所）")
+
+        if dry_run:
+            for dest_path, jobs in groups.items():
+                total_bytes = sum(size for _, _, size, _ in jobs)
+                self._report(f"{dest_path}: {len(jobs)}件 ({total_bytes / (1024 * 1024):.1f} MB)")
+            return self._result(time.perf_counter() - start)
+
+        self._state_handle = open(self.state_file, 'a', encoding='utf-8')
+        executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                      thread_name_prefix="FileMoverBackfill")
+        try:
+            for dest_path, jobs in groups.items():
+                # 移動先ごとにディレクトリ作成を1回だけ行う
+                if self.mover.config.get('create_directories', True):
+                    dest_path.mkdir(parents=True, exist_ok=True)
+                for job in jobs:
+                    executor.submit(self._process_job, job)
+            executor.shutdown(wait=True)
+        except KeyboardInterrupt:
+            # 未着手のジョブは即座に終了し、処理中のファイルだけ完了を待つ
+            self.stop()
+            executor.shutdown(wait=True)
+        finally:
+            self._state_handle.close()
+            self._state_handle = None
+
+        elapsed = time.perf_counter() - start
+        result = self._result(elapsed)
+
+        if self._stop_event.is_set():
+            self.logger.info(f"一括振り分けを中断しました（再実行で続きから処理）: {result['done']}/{result['total']}件")
+        else:
+            # 最後まで完了したら再開用の状態は不要
+            try:
+                os.remove(self.state_file)
+            except OSError:
+                pass
+            self.logger.info(
+                f"一括振り分け完了: {result['moved']}件成功 / {result['failed']}件失敗 "
+                f"{result['elapsed']:.1f}秒 {result['files_per_sec']:.1f} files/s {result['mb_per_sec']:.1f} MB/s"
+            )
+        return result
+
+    def _process_job(self, job):
+        """1ファイル分の振り分け（ワーカースレッド）"""
+        file_path, rule, size, key = job
+        if self._stop_event.is_set():
+            return
+        try:
+            ok = self.mover.execute_rule(file_path, rule)
+        except Exception as e:
+            self.logger.error(f"一括振り分けエラー: {file_path}: {e}")
+            ok = False
+
+        with self._lock:
+            self._stats['done'] += 1
+            if ok:
+                self._stats['moved'] += 1
+                self._stats['bytes'] += size
+                self._state_handle.write(key + '\n')
+                self._state_handle.flush()
+            else:
+                # 失敗したファイルは記録せず、次回の再開時にもう一度処理する
+                self._stats['failed'] += 1
+
+            now = time.monotonic()
+            report = now - self._last_progress >= self.progress_interval or self._stats['done'] == self._stats['total']
+            if report:
+                self._last_progress = now
+                message = f"一括振り分け: {self._stats['done']}/{self._stats['total']}件"
+        if report:
+            self._report(message)
+
+    def _report(self, message):
+        """進捗を通知"""
+        if self.progress_callback:
+            self.progress_callback(message)
+        else:
+            self.logger.info(message)
+
+    def _result(self, elapsed):
+        """実行結果"""
+        result = dict(self._stats)
+        result['elapsed'] = elapsed
+        result['files_per_sec'] = result['done'] / elapsed if elapsed > 0 else 0.0
+        result['mb_per_sec'] = result['bytes'] / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+        return result
+
+
+def main(argv=None):
+    """コマンドラインから一括振り分けを実行"""
+    parser = argparse.ArgumentParser(description="監視フォルダの既存ファイルを一括で振り分けます")
+    parser.add_argument('--config', default="config.json", help="設定ファイル")
+    parser.add_argument('--folder', default=None, help="対象フォルダ（省略時は全監視フォルダ）")
+    parser.add_argument('--workers', type=int, default=None, help="並列数（省略時は設定の max_workers）")
+    parser.add_argument('--dry-run', action='store_true', help="移動せず振り分け予定のみ表示")
+    parser.add_argument('--restart', action='store_true', help="前回の中断状態を破棄して最初から実行")
+    args = parser.parse_args(argv)
+
+    from file_mover.core import FileAutoMover
+
+    mover = FileAutoMover(config_file=args.config)
+    runner = BackfillRunner(mover, folder=args.folder, max_workers=args.workers)
+    if args.restart and os.path.exists(runner.state_file):
+        os.remove(runner.state_file)
+
+    result = runner.run(dry_run=args.dry_run)
+    if runner.interrupted:
+        return 1
+    return 0 if result['failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
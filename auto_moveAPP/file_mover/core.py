@@ -0,0 +1,703 @@
+# -*- coding: utf-8 -*-
+"""
+ファイル自動移動ハンドラー
+watchdog のイベントを受けてルールに従いファイルを振り分ける（GUI非依存）
+"""
+
+import os
+import json
+import logging
+import functools
+import threading
+import time
+from pathlib import Path
+from watchdog.events import FileSystemEventHandler
+from file_mover.pipeline import ProcessingPipeline
+from file_mover import readiness
+from file_mover.readiness import WriteCompletionDetector
+from file_mover import roots
+from file_mover.settings import ConfigSnapshot, ConfigFileWatcher
+from file_mover.probe import FileProbe, SignatureCache
+from file_mover.fileops import same_device, rename_no_clobber, copy_with_hash
+from file_mover import integrity
+from file_mover.integrity import IntegrityVerifier
+from file_mover.name_index import DestinationNameIndex
+from file_mover import journal
+from file_mover.journal import MoveJournal
+from file_mover import dedup
+from file_mover.dedup import DuplicateIndex
+from file_mover.logsetup import configure_logging
+from file_mover import metrics
+from file_mover.metrics import MoveMetrics, MetricsExporter
+from file_mover.io_scheduler import IOScheduler
+
+
+class FileAutoMover(FileSystemEventHandler):
+    """ファイル自動移動ハンドラー"""
+    
+    def __init__(self, config_file="config.json", log_callback=None):
+        self.config_file = config_file
+        self.log_callback = log_callback
+        # 現在の設定スナップショット（更新時は参照ごと差し替える）
+        self.snapshot = None
+        self._config_lock = threading.Lock()
+        self._observer = None
+        config = self.load_config()
+        self.setup_logging(config)
+        self.snapshot = ConfigSnapshot(config, logger=self.logger)
+        self.config_watcher = ConfigFileWatcher(self.config_file, self.reload_config)
+        self.integrity = IntegrityVerifier.from_config(self.config, logger=self.logger)
+        self.name_index = DestinationNameIndex()
+        self.signature_cache = SignatureCache()
+        self.journal = None
+        self.dedup = None
+        self.open_stores()
+        self.readiness = WriteCompletionDetector.from_config(self.config)
+        # 同じファイルへの連続イベントをまとめる待ち時間
+        self.debounce_seconds = self.config.get('readiness', {}).get('debounce_seconds', 0.5)
+        self.metrics = MoveMetrics()
+        self.pipeline = ProcessingPipeline(
+            self.handle_scheduled_file,
+            max_workers=self.config.get('max_workers', 4),
+            logger=self.logger,
+            metrics=self.metrics
+        )
+        self.metrics.add_gauge('pending', self.pipeline.pending_count)
+        # 移動先デバイスごとの転送キュー（無効なら処理ワーカーで直接移動）
+        self.io_scheduler = IOScheduler.from_config(self.config, logger=self.logger)
+        if self.io_scheduler:
+            self.metrics.add_gauge('io_pending', self.io_scheduler.pending_count)
+        self.metrics_exporter = MetricsExporter.from_config(
+            self.metrics, self.config, self.config_file, logger=self.logger)
+        
+    def load_config(self):
+        """設定ファイルを読み込み"""
+        try:
+            if os.path.exists(self.config_file):
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            else:
+                # デフォルト設定を作成
+                default_config = {
+                    "watch_folder": os.path.expanduser("~/Downloads"),
+                    "watch_recursive": False,
+                    "watch_roots": [],
+                    "rules": [
+                        {
+                            "name": "kaunetファイル",
+                            "pattern": ".*kaunet_.*",
+                            "destination": "C:/LocalApp/kaunetAPP/DATA",
+                            "action": "move"
+                        },
+                        {
+                            "name": "PDFファイル",
+                            "pattern": ".*\\.pdf$",
+                            "destination": "Documents/PDF",
+                            "action": "move"
+                        },
+                        {
+                            "name": "画像ファイル",
+                            "pattern": ".*\\.(jpg|jpeg|png|gif|bmp|webp)$",
+                            "destination": "Pictures/Downloads",
+                            "action": "move"
+                        },
+                        {
+                            "name": "動画ファイル",
+                            "pattern": ".*\\.(mp4|avi|mkv|mov|wmv|flv|webm)$",
+                            "destination": "Videos/Downloads",
+                            "action": "move"
+                        },
+                        {
+                            "name": "音楽ファイル",
+                            "pattern": ".*\\.(mp3|wav|flac|aac|ogg|m4a)$",
+                            "destination": "Music/Downloads",
+                            "action": "move"
+                        },
+                        {
+                            "name": "実行ファイル",
+                            "pattern": ".*\\.(exe|msi|app)$",
+                            "destination": "Programs",
+                            "action": "move"
+                        },
+                        {
+                            "name": "圧縮ファイル",
+                            "pattern": ".*\\.(zip|rar|7z|tar|gz)$",
+                            "destination": "Downloads/Archives",
+                            "action": "move"
+                        },
+                        {
+                            "name": "ドキュメント",
+                            "pattern": ".*\\.(doc|docx|txt|rtf|xls|xlsx|ppt|pptx)$",
+                            "destination": "Documents/Downloads",
+                            "action": "move"
+                        },
+                        {
+                            "name": "その他のファイル",
+                            "pattern": ".*",
+                            "destination": "Downloads/Others",
+                            "action": "move"
+                        }
+                    ],
+                    "log_level": "INFO",
+                    "gui_log_lines": 100,
+                    "logging": {
+                        "file": "file_mover.log",
+                        "max_bytes": 10485760,
+                        "rotate_interval_hours": 24,
+                        "backup_count": 5,
+                        "compress": True,
+                        "json": False
+                    },
+                    "max_workers": 4,
+                    "readiness": {
+                        "stable_seconds": 2,
+                        "poll_interval": 0.5,
+                        "debounce_seconds": 0.5,
+                        "timeout": 3600,
+                        "partial_extensions": list(readiness.DEFAULT_PARTIAL_EXTENSIONS)
+                    },
+                    "create_directories": True,
+                    "hot_reload": True,
+                    "safe_move": {
+                        "enabled": True,
+                        "hash_check_threshold": 104857600,
+                        "verify_integrity": True,
+                        "verify_mode": "readback",
+                        "hash_algorithm": "blake2b",
+                        "chunk_size": 1048576,
+                        "sample_blocks": 8
+                    },
+                    "journal": {
+                        "enabled": True,
+                        "max_bytes": 5242880,
+                        "backup_count": 3
+                    },
+                    "dedup": {
+                        "enabled": False,
+                        "action": "skip",
+                        "partial_bytes": 65536,
+                        "hash_algorithm": "blake2b"
+                    },
+                    "io_scheduler": {
+                        "enabled": True,
+                        "default_concurrency": 2,
+                        "size_aging_mb_per_sec": 10,
+                        "small_file_kb": 1024,
+                        "destinations": []
+                    },
+                    "metrics": {
+                        "enabled": True,
+                        "snapshot_file": "metrics.json",
+                        "snapshot_interval": 60,
+                        "http_port": 0
+                    }
+                }
+                self.save_config(default_config)
+                return default_config
+        except Exception as e:
+            print(f"設定ファイル読み込みエラー: {e}")
+            return {}
+    
+    def save_config(self, config):
+        """設定ファイルを保存して反映"""
+        try:
+            # 変更監視が書きかけのファイルを読まないよう一時ファイルから置き換える
+            tmp_path = f"{self.config_file}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(config, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.config_file)
+        except Exception as e:
+            print(f"設定ファイル保存エラー: {e}")
+        
+        if self.snapshot is not None:
+            self.apply_config(config)
+    
+    @property
+    def config(self):
+        """現在の設定（読み取り専用）"""
+        return self.snapshot.config
+    
+    @property
+    def compiled_rules(self):
+        """現在の既定ルール（コンパイル済み）"""
+        return self.snapshot.compiled_rules
+    
+    @property
+    def watch_roots(self):
+        """現在の監視フォルダ一覧"""
+        return self.snapshot.watch_roots
+    
+    def reload_config(self):
+        """config.json を読み直して反映（読めない場合は現在の設定のまま）"""
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"設定ファイルを再読み込みできません（現在の設定で継続）: {e}")
+            return None
+        return self.apply_config(config)
+    
+    def apply_config(self, config):
+        """新しい設定のスナップショットを作成して切り替える（変更のないルールは再コンパイルしない）"""
+        with self._config_lock:
+            previous = self.snapshot
+            if dict(previous.config) == config:
+                return previous
+            snapshot = ConfigSnapshot(config, version=previous.version + 1,
+                                      previous=previous, logger=self.logger)
+            changed = snapshot.changed_sections(previous)
+            
+            # 設定に依存する部品を作り直してからスナップショットを差し替える
+            if 'safe_move' in changed:
+                self.integrity = IntegrityVerifier.from_config(snapshot.config, logger=self.logger)
+            if 'readiness' in changed or 'delay_seconds' in changed:
+                self.readiness = WriteCompletionDetector.from_config(snapshot.config)
+                self.debounce_seconds = snapshot.config.get('readiness', {}).get('debounce_seconds', 0.5)
+            if 'log_level' in changed:
+                configure_logging(snapshot.config)
+            self.snapshot = snapshot
+            
+            roots_changed = snapshot.watch_roots is not previous.watch_roots
+            observer = self._observer
+        
+        self.logger.info(f"設定を反映しました（版 {snapshot.version}: {', '.join(sorted(changed))}）")
+        restart_required = changed & {'max_workers', 'journal', 'dedup', 'logging', 'io_scheduler'}
+        if restart_required:
+            self.logger.info(f"次の設定は再起動後に反映されます: {', '.join(sorted(restart_required))}")
+        if roots_changed and observer is not None:
+            observer.unschedule_all()
+            self.schedule_watches(observer)
+        return snapshot
+    
+    def schedule_watches(self, observer):
+        """全監視フォルダを1つのオブザーバーに登録して、登録したフォルダ一覧を返す"""
+        self._observer = observer
+        if self.config.get('hot_reload', True):
+            observer.schedule(self.config_watcher, self.config_watcher.directory, recursive=False)
+        scheduled = []
+        for root in self.watch_roots:
+            if not os.path.isdir(root.path):
+                self.logger.warning(f"監視フォルダが存在しません: {root.path}")
+                continue
+            observer.schedule(self, root.path, recursive=root.recursive)
+            scheduled.append(root.path)
+        return scheduled
+    
+    def setup_logging(self, config=None):
+        """ログ設定（ファイル書き込みは別スレッドで行う）"""
+        configure_logging(config if config is not None else self.config)
+        self.logger = logging.getLogger(__name__)
+    
+    def open_stores(self):
+        """移動ジャーナルと重複索引を開く（停止後の再開時は開き直す）"""
+        if self.journal is None:
+            self.journal = MoveJournal.from_config(self.config, self.config_file, logger=self.logger)
+        if self.dedup is None:
+            self.dedup = DuplicateIndex.from_config(self.config, self.config_file, logger=self.logger)
+    
+    def close_stores(self):
+        """移動ジャーナルと重複索引を閉じる"""
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        if self.dedup:
+            self.dedup.close()
+            self.dedup = None
+    
+    def start(self):
+        """処理パイプライン開始（前回異常終了時の未完了の移動があれば再開）"""
+        self.open_stores()
+        if self.io_scheduler:
+            self.io_scheduler.start()
+        self.pipeline.start()
+        if self.metrics_exporter:
+            self.metrics_exporter.start()
+        for file_path in self.recover_journal():
+            self.schedule_file(file_path)
+    
+    def stop(self):
+        """処理パイプライン停止"""
+        self._observer = None
+        self.config_watcher.cancel()
+        self.pipeline.stop()
+        if self.io_scheduler:
+            self.io_scheduler.stop()
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        # 実行中の転送は上の停止で完了済み
+        self.close_stores()
+    
+    def on_created(self, event):
+        """ファイル作成時のイベント処理"""
+        if not event.is_directory:
+            self.schedule_file(event.src_path)
+    
+    def on_moved(self, event):
+        """ファイル移動時のイベント処理"""
+        if not event.is_directory:
+            # .crdownload → 本来の名前へのリネームもここで拾う
+            self.schedule_file(event.dest_path)
+    
+    def schedule_file(self, file_path):
+        """処理予約（監視スレッドでは待機せず予約のみ行う）"""
+        if self.readiness.is_partial(file_path):
+            self.logger.debug(f"ダウンロード途中のため無視: {file_path}")
+            return
+        if self.watch_roots.root_for(file_path) is None:
+            # 再帰監視中の移動先フォルダなど
+            return
+        # 同じパスのイベントが続く間は予約をまとめて後ろにずらす
+        self.metrics.mark_seen(file_path)
+        self.pipeline.submit(file_path, self.debounce_seconds)
+    
+    def handle_scheduled_file(self, file_path):
+        """書き込み完了を確認してから処理（未完了なら再予約）"""
+        state = self.readiness.check(file_path)
+        if state == readiness.WAITING:
+            self.pipeline.submit(file_path, self.readiness.poll_interval)
+        elif state == readiness.READY:
+            waited = self.metrics.since_seen(file_path)
+            if waited is not None:
+                self.metrics.observe(metrics.READINESS_WAIT, waited)
+            if not self.process_file(file_path):
+                # I/Oスケジューラに渡した場合は転送完了時に記録する
+                self.metrics.finish(file_path)
+        elif state == readiness.TIMEOUT:
+            self.logger.warning(f"書き込み完了待ちタイムアウト: {file_path}")
+            self.metrics.finish(file_path, completed=False)
+        else:
+            self.logger.debug(f"処理前にファイルが無くなりました: {file_path}")
+            self.metrics.finish(file_path, completed=False)
+    
+    def process_file(self, file_path):
+        """ファイル処理メインロジック（I/Oスケジューラに転送を渡した場合は True）"""
+        event_path = file_path
+        try:
+            file_path = Path(file_path)
+            if not file_path.exists():
+                self.logger.warning(f"ファイルが存在しません: {file_path}")
+                return
+            
+            file_name = file_path.name
+            self.logger.info(f"処理開始: {file_name}")
+            
+            # 監視フォルダごとのルールに基づいて振り分け（先に定義されたルールが優先）
+            compiled = self.watch_roots.rules_for(file_path)
+            if compiled is None:
+                self.logger.debug(f"監視対象外のため無視: {file_path}")
+                return
+            with self.metrics.time(metrics.MATCH):
+                rule = compiled.find(file_name, FileProbe(file_path, self.signature_cache))
+            if rule is not None:
+                if self.io_scheduler and rule.get('action', 'move') in ('move', 'copy'):
+                    return self.submit_transfer(event_path, file_path, rule)
+                self.execute_rule(file_path, rule)
+            else:
+                self.metrics.count('no_match')
+                self.logger.info(f"マッチするルールがありません: {file_name}")
+                
+        except Exception as e:
+            self.logger.error(f"ファイル処理エラー: {e}")
+    
+    def submit_transfer(self, event_path, file_path, rule):
+        """移動先デバイスのキューに転送を予約（小さいファイルから順に処理される）"""
+        dest_path = self.resolve_destination(rule)
+        if dest_path is None:
+            self.execute_rule(file_path, rule)
+            return False
+        
+        def transfer(throttle):
+            try:
+                self.execute_rule(file_path, rule, throttle=throttle)
+            finally:
+                self.metrics.finish(event_path)
+        
+        key = os.path.normcase(os.path.abspath(file_path))
+        return self.io_scheduler.submit(key, dest_path, file_path.stat().st_size, transfer)
+    
+    def resolve_destination(self, rule):
+        """ルールの移動先パス（相対パスはホームディレクトリ基準、未指定なら None）"""
+        return roots.resolve_destination(rule)
+    
+    def execute_rule(self, file_path, rule, throttle=None):
+        """ルール実行（成功したら True。throttle はコピー時の帯域制限）"""
+        entry_id = None
+        try:
+            action = rule.get('action', 'move')
+            
+            # 移動先パスの構築
+            dest_path = self.resolve_destination(rule)
+            if dest_path is None:
+                self.logger.warning("移動先が指定されていません")
+                return False
+            
+            # ディレクトリ作成
+            if self.config.get('create_directories', True):
+                dest_path.mkdir(parents=True, exist_ok=True)
+            
+            # 移動先に同じ内容のファイルがあれば設定に従って処理
+            hashes = {}
+            if action == 'move' and self.dedup:
+                duplicate, hashes = self.dedup.find_duplicate(file_path, dest_path)
+                if duplicate:
+                    self.metrics.count('duplicates')
+                    handled = self.handle_duplicate(file_path, dest_path, duplicate, hashes)
+                    if handled is not None:
+                        return handled
+            
+            # ファイル移動/コピー
+            if action in ('move', 'copy') and self.journal:
+                entry_id = self.journal.begin(file_path, dest_path, action)
+            
+            if action == 'move':
+                # 安全な移動を実行
+                size = file_path.stat().st_size
+                moved, dest_file_path = self.place_file(
+                    functools.partial(self.safe_move, journal_id=entry_id, throttle=throttle), file_path, dest_path)
+                self._journal(entry_id, journal.COMMITTED if moved else journal.FAILED)
+                self.metrics.count_rule(rule.get('name', ''), size, moved)
+                if moved:
+                    if self.dedup:
+                        self.dedup.record(dest_file_path, **hashes)
+                    self.logger.info(f"安全移動完了: {file_path.name} -> {dest_path}")
+                    if self.log_callback:
+                        self.log_callback(f"移動完了: {file_path.name}")
+                else:
+                    self.logger.error(f"安全移動失敗: {file_path.name}")
+                    if self.log_callback:
+                        self.log_callback(f"移動失敗: {file_path.name}")
+                return moved
+                
+            elif action == 'copy':
+                size = file_path.stat().st_size
+                _, dest_file_path = self.place_file(
+                    functools.partial(self.copy_file, journal_id=entry_id, throttle=throttle), file_path, dest_path)
+                self._journal(entry_id, journal.COMMITTED)
+                self.metrics.count_rule(rule.get('name', ''), size, True, action)
+                if self.dedup:
+                    self.dedup.record(dest_file_path)
+                self.logger.info(f"コピー完了: {file_path.name} -> {dest_path}")
+                if self.log_callback:
+                    self.log_callback(f"コピー完了: {file_path.name}")
+                return True
+            
+            self.logger.warning(f"不明なアクション: {action}")
+            return False
+                
+        except Exception as e:
+            self.logger.error(f"ルール実行エラー: {e}")
+            self._journal(entry_id, journal.FAILED, error=str(e))
+            return False
+    
+    def handle_duplicate(self, file_path, dest_path, duplicate, hashes):
+        """重複ファイルの処理（処理できなければ None を返し、通常の移動を行う）"""
+        action = self.dedup.action
+        if action == dedup.SKIP:
+            self.logger.info(f"重複のため移動しません: {file_path.name}（既存: {duplicate}）")
+            if self.log_callback:
+                self.log_callback(f"重複スキップ: {file_path.name}")
+            return True
+        
+        if action == dedup.HARDLINK:
+            def link(src_path, dst_path):
+                os.link(duplicate, dst_path)
+                return True
+            try:
+                _, linked_path = self.place_file(link, file_path, dest_path)
+            except OSError as e:
+                self.logger.warning(f"ハードリンクを作成できないため通常どおり移動します: {file_path.name}: {e}")
+                return None
+            self.dedup.record(linked_path, **hashes)
+            action_label = "ハードリンク"
+        else:
+            action_label = "削除"
+        
+        file_path.unlink()
+        self.logger.info(f"重複のため{action_label}: {file_path.name}（既存: {duplicate}）")
+        if self.log_callback:
+            self.log_callback(f"重複{action_label}: {file_path.name}")
+        return True
+    
+    def _journal(self, entry_id, state, sync=False, **fields):
+        """移動ジャーナルに状態遷移を記録（ジャーナル無効時は何もしない）"""
+        if self.journal and entry_id:
+            self.journal.record(entry_id, state, sync=sync, **fields)
+    
+    def recover_journal(self):
+        """前回異常終了時の未完了エントリを再開・巻き戻し、再処理が必要な移動・コピー元を返す
+        
+        ジャーナルに記録されたパスだけを確認し、移動先フォルダの走査は行わない。
+        """
+        if not self.journal:
+            return []
+        
+        retry = []
+        for entry in self.journal.unfinished():
+            entry_id = entry.get('id')
+            state = entry.get('s')
+            src_path = Path(entry.get('src', ''))
+            dst_path = Path(entry['dst']) if state in (journal.COPYING, journal.RENAMING, journal.VERIFIED) else None
+            try:
+                if state == journal.VERIFIED and dst_path.exists():
+                    # コピー・検証済み：元ファイル削除から再開
+                    if src_path.exists():
+                        src_path.unlink()
+                    self._journal(entry_id, journal.COMMITTED, recovered=True)
+                    self.logger.info(f"中断した移動を完了: {src_path.name} -> {dst_path}")
+                    continue
+                
+                if state == journal.RENAMING and dst_path.exists():
+                    if not src_path.exists():
+                        self._journal(entry_id, journal.COMMITTED, recovered=True)
+                        continue
+                    if os.path.samefile(src_path, dst_path):
+                        # ハードリンク作成後、元の名前の削除前に停止していた
+                        src_path.unlink()
+                        self._journal(entry_id, journal.COMMITTED, recovered=True)
+                        self.logger.info(f"中断した移動を完了: {src_path.name} -> {dst_path}")
+                        continue
+                
+                if state == journal.COPYING and dst_path.exists():
+                    # 書き込み途中のコピー先を削除
+                    dst_path.unlink()
+                    self.logger.info(f"中断したコピーを巻き戻し: {dst_path}")
+                
+                self._journal(entry_id, journal.ROLLED_BACK, recovered=True)
+                # 移動もコピーも元ファイルが残っていれば最初からやり直す
+                if entry.get('action', 'move') in ('move', 'copy') and src_path.exists():
+                    retry.append(src_path)
+                
+            except OSError as e:
+                self.logger.error(f"ジャーナル復旧エラー: {src_path}: {e}")
+                self._journal(entry_id, journal.FAILED, error=str(e), recovered=True)
+        
+        if retry:
+            self.logger.info(f"中断していた移動・コピーを再処理します: {len(retry)}件")
+        return retry
+    
+    def place_file(self, operation, file_path, dest_path):
+        """空きファイル名を予約して operation(移動元, 移動先) を実行
+        
+        移動先は排他的に作成されるため、他プロセスが同名ファイルを作っていた場合は
+        FileExistsError となり、次の名前で再試行する。
+        """
+        for _ in range(100):
+            dest_file_path = self.get_unique_filename(dest_path / file_path.name)
+            try:
+                result = operation(file_path, dest_file_path)
+            except FileExistsError:
+                self.logger.debug(f"同名ファイルが作成されたため別名で再試行: {dest_file_path}")
+                continue
+            except Exception:
+                self.name_index.release(dest_file_path)
+                raise
+            if not result:
+                self.name_index.release(dest_file_path)
+            return result, dest_file_path
+        raise FileExistsError(f"空きファイル名が見つかりません: {dest_path / file_path.name}")
+    
+    def copy_file(self, src_path, dst_path, journal_id=None, throttle=None):
+        """コピー（移動先が既にあれば FileExistsError）"""
+        copy_with_hash(
+            src_path, dst_path,
+            buffer_size=self.integrity.chunk_size,
+            on_open=lambda: self._journal(journal_id, journal.COPYING, sync=True, dst=str(dst_path)),
+            throttle=throttle
+        )
+        return True
+    
+    def safe_move(self, src_path, dst_path, journal_id=None, throttle=None):
+        """安全な移動（同一ボリュームはリネーム、それ以外はコピー→整合性確認→元ファイル削除）
+        
+        移動先が既に存在する場合は上書きせず FileExistsError を送出する。
+        """
+        src_path = Path(src_path)
+        dst_path = Path(dst_path)
+        
+        # 同一ボリュームならアトミックなリネームで完了（データのコピー・検証は不要）
+        if same_device(src_path, dst_path.parent):
+            try:
+                self._journal(journal_id, journal.RENAMING, dst=str(dst_path))
+                with self.metrics.time(metrics.RENAME):
+                    rename_no_clobber(src_path, dst_path)
+                return True
+            except FileExistsError:
+                raise
+            except OSError as e:
+                self.logger.warning(f"リネームに失敗したためコピーで移動します: {e}")
+        
+        verifier = self.integrity
+        
+        try:
+            # 1. ファイルサイズを取得
+            src_size = src_path.stat().st_size
+            
+            # hash_check_threshold 以下は全体ハッシュ、超える場合はサンプリング検証
+            verify_mode = verifier.mode_for(src_size)
+            
+            # 2. コピー実行（移動元の読み込みは1回だけで、同時にハッシュも計算）
+            copy_started = time.perf_counter()
+            copied, src_hash = copy_with_hash(
+                src_path, dst_path,
+                hash_factory=verifier.hash_factory if verify_mode == integrity.FULL else None,
+                buffer_size=verifier.chunk_size,
+                fsync=verifier.fsync,
+                # コピー先を作成したら書き込み前に記録（異常終了時に途中のコピー先を削除できるように）
+                on_open=lambda: self._journal(journal_id, journal.COPYING, sync=True, dst=str(dst_path)),
+                throttle=throttle
+            )
+            self.metrics.observe(metrics.COPY, time.perf_counter() - copy_started)
+            
+            # 3. ファイルサイズ確認
+            dst_size = dst_path.stat().st_size
+            if not (src_size == copied == dst_size):
+                self.logger.error(f"ファイルサイズ不一致: 元={src_size}, 先={dst_size}")
+                dst_path.unlink()
+                return False
+            
+            # 4. ファイルハッシュ確認（コピー先の読み直しのみ）
+            if verify_mode == integrity.FULL:
+                with self.metrics.time(metrics.HASH):
+                    dst_hash = self.calculate_file_hash(dst_path)
+                
+                if src_hash != dst_hash:
+                    self.logger.error(f"ファイルハッシュ不一致: {src_path.name}")
+                    dst_path.unlink()
+                    return False
+            elif verify_mode == integrity.SAMPLE:
+                with self.metrics.time(metrics.HASH):
+                    sample_ok = verifier.verify_sample(src_path, dst_path, src_size)
+                if not sample_ok:
+                    self.logger.error(f"ファイルハッシュ不一致（サンプリング検証）: {src_path.name}")
+                    dst_path.unlink()
+                    return False
+            
+            # 5. 元ファイル削除（検証済みの記録をディスクに書いてから）
+            self._journal(journal_id, journal.VERIFIED, sync=True)
+            with self.metrics.time(metrics.UNLINK):
+                src_path.unlink()
+            return True
+            
+        except FileExistsError:
+            # 既存ファイルは他者のものなので削除しない
+            raise
+        except Exception as e:
+            self.logger.error(f"安全移動エラー: {e}")
+            try:
+                if dst_path.exists():
+                    dst_path.unlink()
+            except:
+                pass
+            return False
+    
+    def calculate_file_hash(self, file_path):
+        """ファイルのハッシュ値を計算"""
+        try:
+            return self.integrity.hash_file(file_path)
+        except Exception as e:
+            self.logger.error(f"ハッシュ計算エラー: {e}")
+            return ""
+    
+    def get_unique_filename(self, file_path):
+        """重複しないファイル名を予約して返す（name_1, name_2 … の連番）"""
+        return Path(self.name_index.reserve(file_path.parent, file_path.name))
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+重複ダウンロードの検出
+移動先ごとのファイルを サイズ → 部分ハッシュ → 全体ハッシュ の順に照合する索引（SQLite）
+
+- サイズが同じファイルが無ければハッシュは計算しない
+- 部分ハッシュ（先頭と末尾のブロック）が一致した時だけ全体ハッシュを計算する
+- 索引の内容は更新日時・サイズで確認し、変わっていれば計算し直す
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+# 重複時の動作
+SKIP = "skip"          # 移動せず元の場所に残す
+HARDLINK = "hardlink"  # 既存ファイルへのハードリンクを作成して元ファイルを削除
+DELETE = "delete"      # 元ファイルを削除
+
+ACTIONS = (SKIP, HARDLINK, DELETE)
+
+# 一致したファイルを削除することもあるため、衝突を作れる短いハッシュ（crc32 など）は使わない
+HASH_ALGORITHMS = {
+    "blake2b": hashlib.blake2b,
+    "sha256": hashlib.sha256,
+}
+
+# 索引ファイル名（設定ファイルと同じディレクトリに作成）
+INDEX_FILE_NAME = "dedup_index.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    partial TEXT,
+    full TEXT,
+    PRIMARY KEY (dir, name)
+);
+CREATE INDEX IF NOT EXISTS files_by_size ON files (dir, size);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class DuplicateIndex:
+    """移動先ディレクトリごとの内容ハッシュ索引"""
+
+    def __init__(self, path, action=SKIP, algorithm="blake2b", partial_bytes=65536, logger=None):
+        self.path = path
+        self.logger = logger or logging.getLogger(__name__)
+        if action not in ACTIONS:
+            self.logger.warning(f"不明な重複時の動作のため {SKIP} を使用します: {action}")
+            action = SKIP
+        self.action = action
+        algorithm = str(algorithm).lower()
+        if algorithm not in HASH_ALGORITHMS:
+            self.logger.warning(f"重複検出に使えないハッシュアルゴリズムのため blake2b を使用します: {algorithm}"
+                                f"（利用可能: {', '.join(HASH_ALGORITHMS)}）")
+            algorithm = "blake2b"
+        self.algorithm = algorithm
+        self.hash_factory = HASH_ALGORITHMS[algorithm]
+        self.partial_bytes = int(partial_bytes)
+
+        self._lock = threading.Lock()
+        # 今回の起動で実際のファイルと突き合わせ済みのディレクトリ
+        self._refreshed = set()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'algorithm'").fetchone()
+        if row is None or row[0] != self.algorithm:
+            # アルゴリズムが変わったら保存済みのハッシュは使えない（必要時に計算し直す）
+            self._conn.execute("UPDATE files SET partial = NULL, full = NULL")
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('algorithm', ?)", (self.algorithm,))
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config, config_file, logger=None):
+        """設定辞書から生成（無効なら None）"""
+        dedup = config.get('dedup', {})
+        if not dedup.get('enabled', False):
+            return None
+        path = dedup.get('path') or os.path.join(
+            os.path.dirname(os.path.abspath(config_file)), INDEX_FILE_NAME)
+        return cls(
+            path,
+            action=dedup.get('action', SKIP),
+            algorithm=dedup.get('hash_algorithm', 'blake2b'),
+            partial_bytes=dedup.get('partial_bytes', 65536),
+            logger=logger
+        )
+
+    @staticmethod
+    def _dir_key(directory):
+        """ディレクトリの比較用キー"""
+        return os.path.normcase(os.path.abspath(os.fspath(directory)))
+
+    def partial_hash(self, file_path, size):
+        """先頭と末尾のブロックのハッシュ"""
+        hasher = self.hash_factory()
+        with open(file_path, 'rb') as f:
+            hasher.update(f.read(self.partial_bytes))
+            if size > self.partial_bytes:
+                f.seek(max(self.partial_bytes, size - self.partial_bytes))
+                hasher.update(f.read(self.partial_bytes))
+        return hasher.hexdigest()
+
+    def full_hash(self, file_path):
+        """ファイル全体のハッシュ"""
+        hasher = self.hash_factory()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def _refresh_directory(self, directory):
+        """初回だけディレクトリを走査し、索引を実際のファイルに合わせる（ハッシュは必要時に計算）"""
+        key = self._dir_key(directory)
+        with self._lock:
+            if key in self._refreshed:
+                return
+        current = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            current[entry.name] = (st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+
+        with self._lock:
+            known = {name: (size, mtime_ns) for name, size, mtime_ns in self._conn.execute(
+                "SELECT name, size, mtime_ns FROM files WHERE dir = ?", (key,))}
+            removed = [(key, name) for name in known if name not in current]
+            changed = [(key, name, size, mtime_ns) for name, (size, mtime_ns) in current.items()
+                       if known.get(name) != (size, mtime_ns)]
+            self._conn.executemany("DELETE FROM files WHERE dir = ? AND name = ?", removed)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (dir, name, size, mtime_ns) VALUES (?, ?, ?, ?)", changed)
+            self._conn.commit()
+            self._refreshed.add(key)
+
+    def _update_hash(self, key, name, column, value):
+        """計算したハッシュを索引に保存"""
+        with self._lock:
+            self._conn.execute(f"UPDATE files SET {column} = ? WHERE dir = ? AND name = ?", (value, key, name))
+            self._conn.commit()
+
+    def find_duplicate(self, file_path, directory):
+        """directory に同じ内容のファイルがあればそのパスを返す
+
+        戻り値: (重複ファイルのパスまたは None, 計算済みのハッシュ {'partial': ..., 'full': ...})
+        """
+        hashes = {}
+        st = os.stat(file_path)
+        self._refresh_directory(directory)
+        key = self._dir_key(directory)
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT name, mtime_ns, partial, full FROM files WHERE dir = ? AND size = ?",
+                (key, st.st_size)).fetchall()
+
+        for name, mtime_ns, partial, full in candidates:
+            candidate = os.path.join(directory, name)
+            try:
+                cst = os.stat(candidate)
+            except OSError:
+                self.forget(candidate)
+                continue
+            if cst.st_size != st.st_size:
+                continue
+            if cst.st_mtime_ns != mtime_ns:
+                # 索引作成後に書き換えられている
+                partial = full = None
+                self.record(candidate)
+
+            try:
+                if 'partial' not in hashes:
+                    hashes['partial'] = self.partial_hash(file_path, st.st_size)
+                if partial is None:
+                    partial = self.partial_hash(candidate, cst.st_size)
+                    self._update_hash(key, name, 'partial', partial)
+                if partial != hashes['partial']:
+                    continue
+
+                if 'full' not in hashes:
+                    hashes['full'] = self.full_hash(file_path)
+                if full is None:
+                    full = self.full_hash(candidate)
+                    self._update_hash(key, name, 'full', full)
+                if full == hashes['full']:
+                    return candidate, hashes
+            except OSError as e:
+                self.logger.debug(f"重複確認で読み込めません: {candidate}: {e}")
+        return None, hashes
+
+    def record(self, file_path, partial=None, full=None):
+        """移動・コピーしたファイルを索引に登録"""
+        directory, name = os.path.split(os.fspath(file_path))
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (dir, name, size, mtime_ns, partial, full) VALUES (?, ?, ?, ?, ?, ?)",
+                (self._dir_key(directory), name, st.st_size, st.st_mtime_ns, partial, full))
+            self._conn.commit()
+
+    def forget(self, file_path):
+        """索引から削除"""
+        directory, name = os.path.split(os.fspath(file_path))
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE dir = ? AND name = ?", (self._dir_key(directory), name))
+            self._conn.commit()
+
+    def close(self):
+        """索引を閉じる"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+ファイル操作の部品
+同一ボリューム判定・上書きしないリネーム・ハッシュ計算しながらのコピーなど
+"""
+
+import errno
+import os
+import shutil
+import threading
+
+# コピー・ハッシュ計算で使う読み込みバッファのサイズ
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# スレッドごとに使い回す読み込みバッファ
+_buffers = threading.local()
+
+
+def _get_buffer(size):
+    """スレッドごとのバッファを取得（サイズが変わった時だけ確保し直す）"""
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None or len(buffer) != size:
+        buffer = bytearray(size)
+        _buffers.buffer = buffer
+    return buffer
+
+
+def same_device(src_path, dst_dir):
+    """移動元ファイルと移動先ディレクトリが同じボリューム上にあるか"""
+    try:
+        return os.stat(src_path).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        return False
+
+
+def rename_no_clobber(src_path, dst_path):
+    """同一ボリューム内でアトミックにリネーム（移動先が既にあれば FileExistsError）"""
+    src_path = os.fspath(src_path)
+    dst_path = os.fspath(dst_path)
+
+    if os.name == 'nt':
+        # Windowsの rename は既存ファイルを上書きせず FileExistsError になる
+        os.rename(src_path, dst_path)
+        return
+
+    # POSIXの rename は上書きしてしまうため、ハードリンク作成で名前を確保する
+    try:
+        os.link(src_path, dst_path)
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK, errno.EXDEV):
+            raise
+        # ハードリンク非対応のファイルシステム：存在確認してから rename
+        if os.path.lexists(dst_path):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst_path)
+        os.rename(src_path, dst_path)
+        return
+    os.unlink(src_path)
+
+
+def copy_with_hash(src_path, dst_path, hash_factory=None, buffer_size=DEFAULT_BUFFER_SIZE, fsync=False,
+                   on_open=None, throttle=None):
+    """1回の読み込みでコピーとハッシュ計算を同時に行う
+
+    移動先は排他作成するため、既に存在すれば FileExistsError になる。
+    on_open は移動先の作成に成功した直後（書き込み前）に呼ばれる。
+    throttle はブロックを書き込むたびに書き込んだバイト数を渡して呼ばれる（帯域制限用）。
+    戻り値は (コピーしたバイト数, 移動元のハッシュ値 or None)。
+    """
+    hasher = hash_factory() if hash_factory else None
+    buffer = _get_buffer(buffer_size)
+    view = memoryview(buffer)
+    copied = 0
+
+    with open(src_path, 'rb') as src, open(dst_path, 'xb') as dst:
+        if on_open is not None:
+            on_open()
+        while True:
+            n = src.readinto(buffer)
+            if not n:
+                break
+            chunk = view[:n]
+            dst.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+            copied += n
+            if throttle is not None:
+                throttle(n)
+        if fsync:
+            dst.flush()
+            os.fsync(dst.fileno())
+
+    # タイムスタンプ等のメタデータもコピー（shutil.copy2 相当）
+    shutil.copystat(src_path, dst_path)
+    return copied, (hasher.hexdigest() if hasher is not None else None)
+
+
+def hash_file(file_path, hash_factory, buffer_size=DEFAULT_BUFFER_SIZE):
+    """ファイル全体のハッシュ値を計算"""
+    hasher = hash_factory()
+    buffer = _get_buffer(buffer_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb') as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
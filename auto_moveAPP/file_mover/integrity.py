@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+コピー整合性確認
+ハッシュアルゴリズムの選択と、大きなファイルのサンプリング検証
+"""
+
+import hashlib
+import logging
+import random
+import zlib
+
+from file_mover.fileops import DEFAULT_BUFFER_SIZE, hash_file
+
+# xxhash は任意（インストールされていれば使う）
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    xxhash = None
+    HAS_XXHASH = False
+
+# サンプリング検証で読むブロックのサイズ
+SAMPLE_BLOCK_SIZE = 1024 * 1024
+
+# 検証方式
+FULL = "full"      # ファイル全体のハッシュ照合
+SAMPLE = "sample"  # 先頭・末尾・ランダムなブロックのハッシュ照合
+NONE = "none"      # サイズ確認のみ
+
+
+class _Crc32:
+    """zlib.crc32 を hashlib と同じインターフェースで使うためのラッパー"""
+
+    name = "crc32"
+
+    def __init__(self):
+        self._value = 0
+
+    def update(self, data):
+        self._value = zlib.crc32(data, self._value)
+
+    def hexdigest(self):
+        return f"{self._value:08x}"
+
+
+def available_algorithms():
+    """利用可能なハッシュアルゴリズム名 -> 生成関数"""
+    algorithms = {
+        "blake2b": hashlib.blake2b,
+        "sha256": hashlib.sha256,
+        "md5": hashlib.md5,
+        "crc32": _Crc32,
+    }
+    if HAS_XXHASH:
+        algorithms["xxh64"] = xxhash.xxh64
+        if hasattr(xxhash, "xxh3_64"):
+            algorithms["xxh3_64"] = xxhash.xxh3_64
+    return algorithms
+
+
+def get_hash_factory(name):
+    """アルゴリズム名から生成関数を取得（未対応なら ValueError）"""
+    algorithms = available_algorithms()
+    try:
+        return algorithms[name.lower()]
+    except KeyError:
+        raise ValueError(f"未対応のハッシュアルゴリズム: {name}（利用可能: {', '.join(algorithms)}）")
+
+
+class IntegrityVerifier:
+    """safe_move の設定に従ってコピー結果を検証する"""
+
+    def __init__(self, algorithm="blake2b", chunk_size=DEFAULT_BUFFER_SIZE,
+                 verify_integrity=True, hash_check_threshold=104857600,
+                 verify_mode="readback", sample_blocks=8, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        try:
+            self.hash_factory = get_hash_factory(algorithm)
+            self.algorithm = algorithm.lower()
+        except ValueError as e:
+            self.logger.warning(f"{e} → blake2b を使用します")
+            self.hash_factory = hashlib.blake2b
+            self.algorithm = "blake2b"
+        self.chunk_size = max(4096, int(chunk_size))
+        self.verify_integrity = bool(verify_integrity)
+        self.hash_check_threshold = int(hash_check_threshold)
+        self.verify_mode = verify_mode
+        self.sample_blocks = max(0, int(sample_blocks))
+
+    @classmethod
+    def from_config(cls, config, logger=None):
+        """設定辞書（config['safe_move']）から生成"""
+        safe_move = config.get('safe_move', {})
+        return cls(
+            algorithm=safe_move.get('hash_algorithm', 'blake2b'),
+            chunk_size=safe_move.get('chunk_size', DEFAULT_BUFFER_SIZE),
+            verify_integrity=safe_move.get('verify_integrity', True),
+            hash_check_threshold=safe_move.get('hash_check_threshold', 104857600),
+            verify_mode=safe_move.get('verify_mode', 'readback'),
+            sample_blocks=safe_move.get('sample_blocks', 8),
+            logger=logger
+        )
+
+    @property
+    def fsync(self):
+        """読み直しをしない場合はコピー先を fsync してから確認する"""
+        return self.verify_mode == 'size'
+
+    def mode_for(self, file_size):
+        """ファイルサイズに応じた検証方式"""
+        if not self.verify_integrity or self.verify_mode == 'size':
+            return NONE
+        if file_size <= self.hash_check_threshold:
+            return FULL
+        if self.sample_blocks > 0:
+            return SAMPLE
+        return NONE
+
+    def hash_file(self, file_path):
+        """ファイル全体のハッシュ値"""
+        return hash_file(file_path, self.hash_factory, self.chunk_size)
+
+    def sample_offsets(self, file_size):
+        """サンプリング検証で読むブロックの開始位置（先頭・末尾・ランダム）"""
+        last = max(0, file_size - SAMPLE_BLOCK_SIZE)
+        offsets = {0, last}
+        block_count = last // SAMPLE_BLOCK_SIZE
+        if block_count > 1:
+            rng = random.SystemRandom()
+            for _ in range(min(self.sample_blocks, block_count - 1)):
+                offsets.add(rng.randrange(1, block_count) * SAMPLE_BLOCK_SIZE)
+        return sorted(offsets)
+
+    def hash_sample(self, file_path, offsets):
+        """指定ブロックのみのハッシュ値"""
+        hasher = self.hash_factory()
+        with open(file_path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                hasher.update(f.read(SAMPLE_BLOCK_SIZE))
+        return hasher.hexdigest()
+
+    def verify_sample(self, src_path, dst_path, file_size):
+        """移動元とコピー先の同じブロックを比較"""
+        offsets = self.sample_offsets(file_size)
+        return self.hash_sample(src_path, offsets) == self.hash_sample(dst_path, offsets)
+
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+移動先デバイスごとの I/O スケジューラ
+移動先のデバイス（ドライブ）ごとにキューと同時実行数を持ち、遅い USB・ネットワークドライブへの
+大きな転送が、他のドライブへの移動や小さなファイルを待たせないようにする
+
+- キュー内は小さいファイルを優先（ただし待ち時間に応じて大きなファイルも順番が来る）
+- 小さなファイル専用のワーカーを1つ持ち、大きな転送で枠が埋まっていても待たせない
+- 移動先ごとに帯域の上限（MB/s）を設定可能
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+
+class TokenBucket:
+    """帯域制限（1秒あたり rate バイト）"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self._allowance = self.rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n):
+        """n バイト分の転送枠を消費（足りなければ待つ）"""
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= n
+            wait = -self._allowance / self.rate if self._allowance < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _DeviceQueue:
+    """1デバイス分のキューとワーカー"""
+
+    def __init__(self, name, concurrency, bucket):
+        self.name = name
+        self.concurrency = max(1, int(concurrency))
+        self.bucket = bucket
+        # (優先度, 連番, キー, 処理関数) のヒープ（小さなファイルは small に入れる）
+        self.heap = []
+        self.small = []
+        self.threads = []
+        self.express = None
+        self.active = 0
+
+    def pending(self):
+        return len(self.heap) + len(self.small)
+
+    def pop(self, express=False):
+        """次の転送を取り出す（express なら小さなファイルのみ）"""
+        if express or not self.heap:
+            return heapq.heappop(self.small) if self.small else None
+        if self.small and self.small[0] < self.heap[0]:
+            return heapq.heappop(self.small)
+        return heapq.heappop(self.heap)
+
+
+class IOScheduler:
+    """移動先デバイスごとのキュー・同時実行数・帯域制限"""
+
+    def __init__(self, default_concurrency=2, destinations=None,
+                 aging_bytes_per_sec=10 * 1024 * 1024, small_file_bytes=1024 * 1024, logger=None):
+        self.default_concurrency = max(1, int(default_concurrency))
+        # [(移動先パス, 同時実行数, 帯域上限 MB/s)]
+        self.destinations = list(destinations or [])
+        self.aging_bytes_per_sec = max(1.0, float(aging_bytes_per_sec))
+        self.small_file_bytes = small_file_bytes
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._condition = threading.Condition()
+        self._counter = itertools.count()
+        self._queues = {}
+        self._device_cache = {}
+        self._queued_keys = set()
+        self._running = False
+
+    @classmethod
+    def from_config(cls, config, logger=None):
+        """設定辞書から生成（無効なら None）"""
+        options = config.get('io_scheduler', {})
+        if not options.get('enabled', True):
+            return None
+        destinations = [
+            (entry['path'], entry.get('concurrency'), entry.get('max_mbps'))
+            for entry in options.get('destinations', []) if entry.get('path')
+        ]
+        return cls(
+            default_concurrency=options.get('default_concurrency', 2),
+            destinations=destinations,
+            aging_bytes_per_sec=options.get('size_aging_mb_per_sec', 10) * 1024 * 1024,
+            small_file_bytes=int(options.get('small_file_kb', 1024) * 1024),
+            logger=logger
+        )
+
+    @staticmethod
+    def _existing_ancestor(path):
+        """存在する最も近い親ディレクトリ（まだ作られていない移動先のデバイス判定用）"""
+        path = os.path.abspath(os.fspath(path))
+        while not os.path.exists(path):
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        return path
+
+    def device_of(self, path):
+        """パスのデバイス番号"""
+        key = os.path.normcase(os.path.abspath(os.fspath(path)))
+        device = self._device_cache.get(key)
+        if device is None:
+            try:
+                device = os.stat(self._existing_ancestor(path)).st_dev
+            except OSError:
+                device = key
+            self._device_cache[key] = device
+        return device
+
+    def _queue_for(self, device):
+        """デバイスのキューを取得（初回は設定から同時実行数・帯域上限を決める）"""
+        queue = self._queues.get(device)
+        if queue is None:
+            concurrency, max_mbps = self.default_concurrency, None
+            for path, dest_concurrency, dest_mbps in self.destinations:
+                if self.device_of(path) == device:
+                    concurrency = dest_concurrency or concurrency
+                    max_mbps = dest_mbps
+                    break
+            bucket = TokenBucket(max_mbps * 1024 * 1024) if max_mbps else None
+            queue = _DeviceQueue(device, concurrency, bucket)
+            self._queues[device] = queue
+        return queue
+
+    def start(self):
+        """受付開始"""
+        with self._condition:
+            self._running = True
+
+    def stop(self, wait=True):
+        """停止（キューに残ったものは破棄し、実行中の転送は完了を待つ）"""
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            pending = sum(queue.pending() for queue in self._queues.values())
+            threads = []
+            for queue in self._queues.values():
+                queue.heap.clear()
+                queue.small.clear()
+                threads.extend(queue.threads)
+                if queue.express is not None:
+                    threads.append(queue.express)
+            self._queued_keys.clear()
+            self._condition.notify_all()
+        if pending:
+            self.logger.info(f"未処理の転送を破棄しました: {pending}件")
+        if wait:
+            for thread in threads:
+                thread.join()
+        with self._condition:
+            for queue in self._queues.values():
+                queue.threads = []
+                queue.express = None
+
+    def submit(self, key, dest_dir, size, func):
+        """転送を予約（停止中なら False。同じキーが予約・実行中なら何もしない）
+
+        func(throttle) はデバイスのワーカースレッドで呼ばれる。throttle は帯域制限用の
+        関数（制限なしなら None）で、コピーしたバイト数を渡す。
+        """
+        device = self.device_of(dest_dir)
+        with self._condition:
+            if not self._running:
+                self.logger.warning(f"I/Oスケジューラ停止中のため予約できません: {key}")
+                return False
+            if key in self._queued_keys:
+                return True
+            queue = self._queue_for(device)
+            # 小さいファイルほど早い期限（待ち時間が延びれば大きなファイルの番も来る）
+            priority = time.monotonic() + size / self.aging_bytes_per_sec
+            small = size <= self.small_file_bytes
+            heapq.heappush(queue.small if small else queue.heap,
+                           (priority, next(self._counter), key, func))
+            self._queued_keys.add(key)
+            if len(queue.threads) < queue.concurrency and queue.active + queue.pending() > len(queue.threads):
+                thread = threading.Thread(target=self._worker, args=(queue,),
+                                          name=f"FileMoverIO-{len(queue.threads) + 1}", daemon=True)
+                queue.threads.append(thread)
+                thread.start()
+            elif small and queue.express is None and len(queue.threads) >= queue.concurrency:
+                queue.express = threading.Thread(target=self._worker, args=(queue, True),
+                                                 name="FileMoverIO-small", daemon=True)
+                queue.express.start()
+            self._condition.notify_all()
+        return True
+
+    def pending_count(self):
+        """予約・実行中の転送数"""
+        with self._condition:
+            return len(self._queued_keys)
+
+    def _worker(self, queue, express=False):
+        """デバイスのワーカー（キューから小さい順に取り出して実行。express は小さなファイル専用）"""
+        throttle = queue.bucket.consume if queue.bucket is not None else None
+        while True:
+            with self._condition:
+                while self._running and not (queue.small if express else queue.pending()):
+                    self._condition.wait()
+                if not self._running:
+                    return
+                _, _, key, func = queue.pop(express)
+                queue.active += 1
+            try:
+                func(throttle)
+            except Exception as e:
+                self.logger.error(f"転送エラー: {key}: {e}")
+            finally:
+                with self._condition:
+                    queue.active -= 1
+                    self._queued_keys.discard(key)
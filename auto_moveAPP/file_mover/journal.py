@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+移動ジャーナル
+移動処理の状態遷移を1行ずつ追記し、異常終了後の再開・巻き戻しと監査ログに使う
+
+状態遷移:
+    queued → copying   → verified → committed   （別ボリューム：コピー→検証→元ファイル削除）
+    queued → renaming  → committed              （同一ボリューム：リネーム）
+    いずれの段階からも → failed / rolled_back
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+QUEUED = "queued"
+COPYING = "copying"
+RENAMING = "renaming"
+VERIFIED = "verified"
+COMMITTED = "committed"
+FAILED = "failed"
+ROLLED_BACK = "rolled_back"
+
+# これらの状態で終わっているエントリは再開不要
+FINISHED_STATES = (COMMITTED, FAILED, ROLLED_BACK)
+
+
+class MoveJournal:
+    """追記専用・fsyncまとめ書きの移動ジャーナル"""
+
+    def __init__(self, path, max_bytes=5 * 1024 * 1024, backup_count=3, logger=None):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.backup_count = max(0, int(backup_count))
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._session = f"{int(time.time() * 1000):x}"
+        # 書き込み済み／fsync済みの連番（fsync のまとめ実行に使う）
+        self._written_seq = 0
+        self._synced_seq = 0
+        # 未完了エントリの最新レコード（ローテーション時に新ファイルへ引き継ぐ）
+        self._open_entries = {}
+
+        self._replayed = self._read_unfinished()
+        self._open_entries.update(self._replayed)
+        self._handle = open(self.path, 'a', encoding='utf-8')
+        if self._handle.tell() > 0 and not self._ends_with_newline():
+            # 書き込み途中で落ちた最終行の後ろに続けて書かないよう改行で区切る
+            self._handle.write('\n')
+            self._handle.flush()
+
+    def _ends_with_newline(self):
+        """ジャーナルファイルが改行で終わっているか"""
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    @classmethod
+    def from_config(cls, config, config_file, logger=None):
+        """設定辞書から生成（無効なら None）"""
+        journal = config.get('journal', {})
+        if not journal.get('enabled', True):
+            return None
+        path = journal.get('path') or os.path.join(
+            os.path.dirname(os.path.abspath(config_file)), "move_journal.log")
+        return cls(
+            path,
+            max_bytes=journal.get('max_bytes', 5 * 1024 * 1024),
+            backup_count=journal.get('backup_count', 3),
+            logger=logger
+        )
+
+    def _read_unfinished(self):
+        """既存のジャーナルを読み、未完了エントリの最新レコードを返す"""
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 書き込み途中で落ちた最終行は無視
+                    continue
+                entry_id = record.get('id')
+                if record.get('s') in FINISHED_STATES:
+                    entries.pop(entry_id, None)
+                else:
+                    # src / dst は最初のレコードにしかないので前のレコードに重ねる
+                    merged = entries.get(entry_id, {})
+                    merged.update(record)
+                    entries[entry_id] = merged
+        return entries
+
+    def unfinished(self):
+        """起動時点で未完了だったエントリ（最新レコード）の一覧"""
+        return list(self._replayed.values())
+
+    def begin(self, src, dst_dir, action="move"):
+        """新しい移動エントリを開始（queued）してIDを返す"""
+        entry_id = f"{self._session}-{next(self._ids)}"
+        self.record(entry_id, QUEUED, src=str(src), dst=str(dst_dir), action=action)
+        return entry_id
+
+    def record(self, entry_id, state, sync=False, **fields):
+        """状態遷移を1行追記（sync=True ならディスクへの書き込みまで待つ）"""
+        record = {'t': round(time.time(), 3), 'id': entry_id, 's': state}
+        record.update(fields)
+
+        with self._lock:
+            previous = self._open_entries.get(entry_id)
+            if state in FINISHED_STATES:
+                self._open_entries.pop(entry_id, None)
+                self._replayed.pop(entry_id, None)
+            else:
+                # 後から参照できるよう src / dst などは前のレコードから引き継ぐ
+                merged = dict(previous or {})
+                merged.update(record)
+                self._open_entries[entry_id] = merged
+
+            self._handle.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self._handle.flush()
+            self._written_seq += 1
+            seq = self._written_seq
+
+            if self._handle.tell() >= self.max_bytes:
+                self._rotate()
+                seq = self._written_seq
+
+        if sync:
+            self.sync(seq)
+
+    def sync(self, seq=None):
+        """fsync（複数スレッドからの要求は1回の fsync にまとめる）"""
+        with self._lock:
+            target = self._written_seq if seq is None else seq
+        if self._synced_seq >= target:
+            return
+        with self._sync_lock:
+            if self._synced_seq >= target:
+                # 待っている間に他のスレッドが fsync 済み
+                return
+            with self._lock:
+                current = self._written_seq
+                fd = self._handle.fileno()
+            # fsync 中も他スレッドの追記は止めない
+            try:
+                os.fsync(fd)
+            except OSError:
+                # ローテーションで閉じられた（ローテーション時に fsync 済み）
+                pass
+            self._synced_seq = max(self._synced_seq, current)
+
+    def _rotate(self):
+        """ジャーナルをローテーション（未完了エントリは新しいファイルへ引き継ぐ）"""
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+        self._handle = open(self.path, 'a', encoding='utf-8')
+        for record in self._open_entries.values():
+            self._handle.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._synced_seq = self._written_seq
+
+    def close(self):
+        """ジャーナルを閉じる"""
+        with self._lock:
+            if self._handle and not self._handle.closed:
+                self._handle.flush()
+                os.fsync(self._handle.fileno())
+                self._handle.close()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+ログ出力の設定
+ワーカースレッドはキューに積むだけで、ファイル書き込み・ローテーション・圧縮は
+QueueListener のスレッドで行う
+"""
+
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import time
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# 設定済みの QueueListener（複数回呼ばれてもハンドラーを重複させない）
+_listener = None
+
+
+class JsonLineFormatter(logging.Formatter):
+    """1レコード1行のJSON形式"""
+
+    def format(self, record):
+        entry = {
+            'time': f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _gzip_rotator(source, dest):
+    """ローテーションしたログを gzip 圧縮"""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """サイズ上限または一定時間の経過でローテーションするファイルハンドラー"""
+
+    def __init__(self, filename, max_bytes=0, backup_count=0, interval_seconds=0,
+                 compress=False, encoding='utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count,
+                         encoding=encoding, delay=True)
+        self.interval_seconds = interval_seconds
+        # 既存ファイルがあればその作成（更新）時刻から経過時間を数える
+        try:
+            started = os.path.getmtime(filename) if os.path.getsize(filename) > 0 else time.time()
+        except OSError:
+            started = time.time()
+        self.rollover_at = started + interval_seconds if interval_seconds > 0 else None
+        if compress:
+            self.namer = lambda name: name + ".gz"
+            self.rotator = _gzip_rotator
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.interval_seconds > 0:
+            self.rollover_at = time.time() + self.interval_seconds
+
+
+def configure_logging(config):
+    """ログ設定（アプリ全体で1回だけ有効）"""
+    global _listener
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, config.get('log_level', 'INFO').upper(), logging.INFO))
+    if _listener is not None:
+        return
+
+    options = config.get('logging', {})
+    file_handler = SizeAndTimeRotatingFileHandler(
+        options.get('file', 'file_mover.log'),
+        max_bytes=options.get('max_bytes', 10 * 1024 * 1024),
+        backup_count=options.get('backup_count', 5),
+        interval_seconds=options.get('rotate_interval_hours', 24) * 3600,
+        compress=options.get('compress', True)
+    )
+    if options.get('json', False):
+        file_handler.setFormatter(JsonLineFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers = [file_handler]
+
+    # PyInstaller のウィンドウアプリでは標準エラーが無い
+    if sys.stderr is not None:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(stream_handler)
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # 終了時にキューに残ったログを書き出す
+    atexit.register(_listener.stop)
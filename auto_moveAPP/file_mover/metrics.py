@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+処理時間・件数の計測
+工程ごとの所要時間（キュー待ち・書き込み完了待ち・ルール判定・コピー・ハッシュ・削除）、
+ルールごとの件数と転送量、検出から移動完了までの遅延分布を集計する
+
+公開方法:
+- GUI のステータス欄
+- 定期的な JSON スナップショット（metrics.json）
+- ローカル HTTP の /metrics（Prometheus 形式）と /metrics.json
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 工程名
+QUEUE_WAIT = "queue_wait"          # 予約時刻からワーカーが処理を始めるまで
+READINESS_WAIT = "readiness_wait"  # 最初のイベントから書き込み完了と判定されるまで
+MATCH = "match"                    # ルール判定
+RENAME = "rename"                  # 同一ボリュームのリネーム
+COPY = "copy"                      # 別ボリュームへのコピー（全体ハッシュの計算を含む）
+HASH = "hash"                      # コピー先の検証
+UNLINK = "unlink"                  # 元ファイルの削除
+
+STAGES = (QUEUE_WAIT, READINESS_WAIT, MATCH, RENAME, COPY, HASH, UNLINK)
+
+# ヒストグラムの区切り（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+class Histogram:
+    """固定区切りのヒストグラム（呼び出し側で排他制御する）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """区切りの上端で近似した分位点（最大値を超えない）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= target:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'avg': round(self.sum / self.count, 6) if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'max': round(self.max, 6),
+        }
+
+
+class MoveMetrics:
+    """振り分け処理の計測値（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.end_to_end = Histogram()
+        self.counters = {'moved': 0, 'copied': 0, 'failed': 0, 'no_match': 0, 'duplicates': 0}
+        self.bytes_moved = 0
+        # ルール名 -> {'files', 'bytes', 'failed'}
+        self.rules = {}
+        # パス -> 最初にイベントを受けた時刻
+        self._first_seen = {}
+        # 名前 -> 現在値を返す関数（待機中の件数など）
+        self._gauges = {}
+
+    def add_gauge(self, name, func):
+        """スナップショット時に値を取得する項目を登録"""
+        self._gauges[name] = func
+
+    def observe(self, stage, seconds):
+        """工程の所要時間を記録"""
+        with self._lock:
+            self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        """with ブロックの所要時間を記録"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        """件数を加算"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def count_rule(self, rule_name, size, ok, action="move"):
+        """ルールごとの処理結果を記録"""
+        with self._lock:
+            stats = self.rules.setdefault(rule_name, {'files': 0, 'bytes': 0, 'failed': 0})
+            if ok:
+                stats['files'] += 1
+                stats['bytes'] += size
+                self.bytes_moved += size
+                key = 'moved' if action == 'move' else 'copied'
+            else:
+                stats['failed'] += 1
+                key = 'failed'
+            self.counters[key] += 1
+
+    def mark_seen(self, path):
+        """最初のイベントの時刻を記録（同じパスの2回目以降は無視）"""
+        with self._lock:
+            self._first_seen.setdefault(os.fspath(path), time.monotonic())
+
+    def since_seen(self, path):
+        """最初のイベントからの経過秒数（記録がなければ None）"""
+        with self._lock:
+            seen = self._first_seen.get(os.fspath(path))
+        return None if seen is None else time.monotonic() - seen
+
+    def finish(self, path, completed=True):
+        """ファイルの処理終了（completed なら検出からの遅延を記録）"""
+        with self._lock:
+            seen = self._first_seen.pop(os.fspath(path), None)
+            if completed and seen is not None:
+                self.end_to_end.observe(time.monotonic() - seen)
+
+    def snapshot(self):
+        """現在の計測値を辞書で返す"""
+        with self._lock:
+            result = {
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'uptime': round(time.time() - self.started, 1),
+                'counters': dict(self.counters),
+                'bytes_moved': self.bytes_moved,
+                'in_progress': len(self._first_seen),
+                'rules': {name: dict(stats) for name, stats in self.rules.items()},
+                'stages': {stage: hist.summary() for stage, hist in self.stages.items()},
+                'end_to_end': self.end_to_end.summary(),
+            }
+        for name, func in self._gauges.items():
+            try:
+                result[name] = func()
+            except Exception:
+                result[name] = None
+        return result
+
+    def to_prometheus(self):
+        """Prometheus のテキスト形式"""
+        lines = []
+        snapshot = self.snapshot()
+
+        lines.append("# TYPE file_mover_files_total counter")
+        for name, value in snapshot['counters'].items():
+            lines.append(f'file_mover_files_total{{result="{name}"}} {value}')
+        lines.append("# TYPE file_mover_bytes_moved_total counter")
+        lines.append(f"file_mover_bytes_moved_total {snapshot['bytes_moved']}")
+
+        # 同じメトリクスの行は TYPE 行の直後にまとめる（混在させると読み込めない）
+        for field in ('files', 'bytes', 'failed'):
+            lines.append(f"# TYPE file_mover_rule_{field}_total counter")
+            for name, stats in snapshot['rules'].items():
+                lines.append(f'file_mover_rule_{field}_total{{rule="{_escape_label(name)}"}} {stats[field]}')
+
+        with self._lock:
+            histograms = [('file_mover_stage_seconds', f'stage="{stage}",', hist)
+                          for stage, hist in self.stages.items()]
+            histograms.append(('file_mover_end_to_end_seconds', '', self.end_to_end))
+            for i, (metric, labels, hist) in enumerate(histograms):
+                if i == 0 or histograms[i - 1][0] != metric:
+                    lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, n in zip(hist.buckets + (float('inf'),), hist.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket{{{labels}le="{le}"}} {cumulative}')
+                suffix = f'{{{labels.rstrip(",")}}}' if labels else ''
+                lines.append(f"{metric}_sum{suffix} {hist.sum}")
+                lines.append(f"{metric}_count{suffix} {hist.count}")
+
+        for name in ('in_progress', *self._gauges):
+            value = snapshot.get(name)
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE file_mover_{name} gauge")
+                lines.append(f"file_mover_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    """Prometheus のラベル値をエスケープ"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """/metrics と /metrics.json を返す"""
+
+    def do_GET(self):
+        metrics = self.server.metrics
+        if self.path == '/metrics':
+            body = metrics.to_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path == '/metrics.json':
+            body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # アクセスログは出さない
+        pass
+
+
+class MetricsExporter:
+    """計測値の定期 JSON 出力とローカル HTTP 公開"""
+
+    def __init__(self, metrics, snapshot_file=None, snapshot_interval=60.0,
+                 http_host="127.0.0.1", http_port=0, logger=None):
+        self.metrics = metrics
+        self.snapshot_file = snapshot_file
+        self.snapshot_interval = max(1.0, float(snapshot_interval))
+        self.http_host = http_host
+        self.http_port = int(http_port)
+        self.logger = logger or logging.getLogger(__name__)
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._server = None
+
+    @classmethod
+    def from_config(cls, metrics, config, config_file, logger=None):
+        """設定辞書から生成（無効なら None）"""
+        options = config.get('metrics', {})
+        if not options.get('enabled', True):
+            return None
+        snapshot_file = options.get('snapshot_file', 'metrics.json')
+        if snapshot_file and not os.path.isabs(snapshot_file):
+            snapshot_file = os.path.join(os.path.dirname(os.path.abspath(config_file)), snapshot_file)
+        return cls(
+            metrics,
+            snapshot_file=snapshot_file or None,
+            snapshot_interval=options.get('snapshot_interval', 60),
+            http_host=options.get('http_host', '127.0.0.1'),
+            http_port=options.get('http_port', 0),
+            logger=logger
+        )
+
+    def start(self):
+        """出力を開始"""
+        self._stop_event.clear()
+        if self.snapshot_file:
+            self._start_thread(self._snapshot_loop, "FileMoverMetrics")
+        if self.http_port:
+            try:
+                self._server = ThreadingHTTPServer((self.http_host, self.http_port), _MetricsRequestHandler)
+            except OSError as e:
+                self.logger.error(f"メトリクスのHTTP公開を開始できません: {self.http_host}:{self.http_port}: {e}")
+            else:
+                self._server.daemon_threads = True
+                self._server.metrics = self.metrics
+                self._start_thread(self._server.serve_forever, "FileMoverMetricsHTTP")
+                self.logger.info(f"メトリクス公開: http://{self.http_host}:{self.http_port}/metrics")
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        """出力を停止（最後のスナップショットを書き出す）"""
+        self._stop_event.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        if self.snapshot_file:
+            self.write_snapshot()
+
+    def _snapshot_loop(self):
+        while not self._stop_event.wait(self.snapshot_interval):
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        """スナップショットを JSON ファイルに書き出す"""
+        tmp_path = f"{self.snapshot_file}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.metrics.snapshot(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.snapshot_file)
+        except OSError as e:
+            self.logger.warning(f"メトリクスを書き出せません: {e}")
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+移動先ディレクトリごとのファイル名インデックス
+初回だけ os.scandir で既存の名前を読み込み、以降は自分の移動結果で更新する
+同名ファイルがある場合の連番（name_1, name_2 …）を exists() の繰り返しなしで決める
+"""
+
+import os
+import re
+import threading
+
+# 連番付きの名前（stem_数字）
+_NUMBERED_STEM = re.compile(r'^(?P<base>.*)_(?P<number>\d+)$')
+
+
+class _DirectoryEntry:
+    """1ディレクトリ分の名前集合と、stem + 拡張子ごとの最大連番"""
+
+    def __init__(self, directory):
+        self.lock = threading.Lock()
+        self.names = set()
+        self.max_number = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    self.add(entry.name)
+        except OSError:
+            # まだ存在しないディレクトリは空として扱う
+            pass
+
+    def add(self, name):
+        """使用中の名前として登録"""
+        key = os.path.normcase(name)
+        self.names.add(key)
+        stem, suffix = os.path.splitext(key)
+        m = _NUMBERED_STEM.match(stem)
+        if m:
+            counter_key = (m.group('base'), suffix)
+            number = int(m.group('number'))
+            if number > self.max_number.get(counter_key, 0):
+                self.max_number[counter_key] = number
+
+
+class DestinationNameIndex:
+    """移動先の空きファイル名を O(1) で割り当てる"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, directory):
+        """ディレクトリのエントリを取得（初回のみ scandir）"""
+        key = os.path.normcase(os.path.abspath(directory))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            # scandir はロック外で行い、競合した場合は先に登録された方を使う
+            created = _DirectoryEntry(directory)
+            with self._lock:
+                entry = self._entries.setdefault(key, created)
+        return entry
+
+    def reserve(self, directory, file_name):
+        """空いている名前を予約してパスを返す
+
+        同じプロセスのワーカー同士では同じ名前が返らない。実際の作成は
+        呼び出し側が排他的に行い（O_EXCL / os.link）、FileExistsError の場合は
+        再度 reserve() する（その名前は使用中として登録済み）。
+        """
+        entry = self._entry(directory)
+        stem, suffix = os.path.splitext(file_name)
+        with entry.lock:
+            if os.path.normcase(file_name) not in entry.names:
+                name = file_name
+            else:
+                counter_key = (os.path.normcase(stem), os.path.normcase(suffix))
+                number = entry.max_number.get(counter_key, 0) + 1
+                name = f"{stem}_{number}{suffix}"
+                while os.path.normcase(name) in entry.names:
+                    number += 1
+                    name = f"{stem}_{number}{suffix}"
+            entry.add(name)
+        return os.path.join(directory, name)
+
+    def release(self, file_path):
+        """移動に失敗した予約を取り消す"""
+        directory, name = os.path.split(os.fspath(file_path))
+        entry = self._entry(directory)
+        with entry.lock:
+            entry.names.discard(os.path.normcase(name))
+
+    def forget(self, directory):
+        """ディレクトリのキャッシュを破棄（次回 scandir し直す）"""
+        key = os.path.normcase(os.path.abspath(directory))
+        with self._lock:
+            self._entries.pop(key, None)
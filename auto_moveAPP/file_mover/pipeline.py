@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+ファイル処理パイプライン
+監視イベント → 遅延スケジューラ → ワーカープール の順にファイルを流す
+
+同じパスへの予約は1つにまとめる（created / modified / moved が続けて届いても処理は1回）。
+処理中のパスに届いた予約は、処理が終わってから1回だけ再予約する。
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from file_mover import metrics
+
+
+class ProcessingPipeline:
+    """遅延付きキューとワーカープールによる非ブロッキング処理パイプライン"""
+
+    def __init__(self, handler, max_workers=4, logger=None, metrics=None):
+        self.handler = handler
+        self.metrics = metrics
+        self.max_workers = max(1, int(max_workers))
+        self.logger = logger or logging.getLogger(__name__)
+
+        # (処理予定時刻, 連番, キー, パス) のヒープ
+        self._heap = []
+        self._counter = itertools.count()
+        # キー → 有効な予約の連番（古い予約はヒープから取り出した時に捨てる）
+        self._pending = {}
+        # 処理中のキーと、処理中に届いた再予約（キー → 遅延秒）
+        self._in_flight = set()
+        self._resubmit = {}
+        self._condition = threading.Condition()
+        self._running = False
+        self._scheduler_thread = None
+        self._executor = None
+
+    @property
+    def running(self):
+        """パイプラインが稼働中かどうか"""
+        return self._running
+
+    def start(self):
+        """スケジューラとワーカープールを開始"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="FileMoverWorker"
+            )
+            self._scheduler_thread = threading.Thread(
+                target=self._scheduler_loop,
+                name="FileMoverScheduler",
+                daemon=True
+            )
+            self._scheduler_thread.start()
+
+    def stop(self, wait=True):
+        """パイプラインを停止（未処理の予約は破棄）"""
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            pending = len(self._pending)
+            self._heap.clear()
+            self._pending.clear()
+            self._resubmit.clear()
+            self._condition.notify_all()
+
+        if pending:
+            self.logger.info(f"未処理の予約を破棄しました: {pending}件")
+
+        if self._scheduler_thread:
+            self._scheduler_thread.join(timeout=5)
+            self._scheduler_thread = None
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    @staticmethod
+    def _key(path):
+        """同一ファイル判定用のキー"""
+        return os.path.normcase(os.path.abspath(os.fspath(path)))
+
+    def submit(self, path, delay=0):
+        """パスを処理予約（delay秒後にワーカーへ渡す）
+
+        同じパスが予約済みなら予定時刻を後ろにずらして1つにまとめる。
+        処理中なら、処理完了後に再予約する。
+        """
+        delay = max(0.0, float(delay))
+        key = self._key(path)
+        with self._condition:
+            if not self._running:
+                self.logger.warning(f"パイプライン停止中のため予約できません: {path}")
+                return False
+            if key in self._in_flight:
+                self._resubmit[key] = max(delay, self._resubmit.get(key, 0.0))
+                return True
+            self._push(key, path, time.monotonic() + delay)
+        return True
+
+    def _push(self, key, path, due):
+        """予約をヒープに追加（同じキーの古い予約は無効になる）"""
+        seq = next(self._counter)
+        self._pending[key] = seq
+        heapq.heappush(self._heap, (due, seq, key, path))
+        self._condition.notify()
+
+    def pending_count(self):
+        """待機中の予約数"""
+        with self._condition:
+            return len(self._pending)
+
+    def _scheduler_loop(self):
+        """処理予定時刻に達したパスをワーカープールへ渡す"""
+        while True:
+            with self._condition:
+                while self._running:
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    timeout = self._heap[0][0] - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+
+                # 期限切れの予約をまとめて取り出す
+                now = time.monotonic()
+                ready = []
+                while self._heap and self._heap[0][0] <= now:
+                    due, seq, key, path = heapq.heappop(self._heap)
+                    if self._pending.get(key) != seq:
+                        # 後から届いた予約に置き換えられた
+                        continue
+                    del self._pending[key]
+                    self._in_flight.add(key)
+                    ready.append((key, path, due))
+                executor = self._executor
+
+            for key, path, due in ready:
+                try:
+                    executor.submit(self._run_handler, key, path, due)
+                except RuntimeError:
+                    # シャットダウン中
+                    return
+
+    def _run_handler(self, key, path, due):
+        """ワーカースレッドでハンドラーを実行"""
+        if self.metrics is not None:
+            self.metrics.observe(metrics.QUEUE_WAIT, max(0.0, time.monotonic() - due))
+        try:
+            self.handler(path)
+        except Exception as e:
+            self.logger.error(f"パイプライン処理エラー: {path}: {e}")
+        finally:
+            with self._condition:
+                self._in_flight.discard(key)
+                delay = self._resubmit.pop(key, None)
+                if delay is not None and self._running:
+                    self._push(key, path, time.monotonic() + delay)
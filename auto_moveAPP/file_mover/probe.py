@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+ファイル内容の簡易判定（サイズ・更新日時・先頭バイトによる MIME タイプ）
+必要になった項目だけを調べ、先頭バイトの判定結果は (パス, 更新日時, サイズ) ごとにキャッシュする
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# 判定に読む先頭バイト数
+HEADER_SIZE = 512
+
+# (オフセット, シグネチャ, MIME タイプ)  先に書いたものを優先
+_SIGNATURES = [
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'BM', 'image/bmp'),
+    (0, b'II*\x00', 'image/tiff'),
+    (0, b'MM\x00*', 'image/tiff'),
+    (0, b'\x00\x00\x01\x00', 'image/x-icon'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'PK\x05\x06', 'application/zip'),
+    (0, b'Rar!\x1a\x07', 'application/vnd.rar'),
+    (0, b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'BZh', 'application/x-bzip2'),
+    (0, b'\xfd7zXZ\x00', 'application/x-xz'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),
+    (0, b'MZ', 'application/x-msdownload'),
+    (0, b'SQLite format 3\x00', 'application/vnd.sqlite3'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'\xff\xfb', 'audio/mpeg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'\x1aE\xdf\xa3', 'video/webm'),
+]
+
+# RIFF コンテナ（8バイト目からの種別）
+_RIFF_TYPES = {b'WEBP': 'image/webp', b'WAVE': 'audio/wav', b'AVI ': 'video/x-msvideo'}
+
+# ISO BMFF（4バイト目が ftyp、8バイト目からのブランド）
+_FTYP_BRANDS = {b'M4A ': 'audio/mp4', b'heic': 'image/heic', b'heix': 'image/heic',
+                b'avif': 'image/avif', b'qt  ': 'video/quicktime'}
+
+# ZIP の先頭エントリ名から判定する Office Open XML など
+_ZIP_ENTRY_TYPES = [
+    (b'word/', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    (b'xl/', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    (b'ppt/', 'application/vnd.openxmlformats-officedocument.presentationml.presentation'),
+    (b'mimetypeapplication/epub+zip', 'application/epub+zip'),
+]
+
+_SIZE_PATTERN = re.compile(r'^\s*(?P<number>\d+(?:\.\d+)?)\s*(?P<unit>[KMGT]?I?B?)\s*$', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(value):
+    """サイズ指定（数値または "10MB" などの文字列）をバイト数に変換"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    m = _SIZE_PATTERN.match(str(value))
+    if not m:
+        raise ValueError(f"サイズの指定が不正です: {value}")
+    unit = m.group('unit').upper().rstrip('B').rstrip('I')
+    return int(float(m.group('number')) * _SIZE_UNITS[unit])
+
+
+def detect_mime(header):
+    """先頭バイトから MIME タイプを判定"""
+    for offset, signature, mime in _SIGNATURES:
+        if header.startswith(signature, offset):
+            if mime == 'application/zip':
+                # 先頭エントリ名はローカルファイルヘッダーの30バイト目から
+                name = header[30:30 + 64]
+                for prefix, zip_mime in _ZIP_ENTRY_TYPES:
+                    if name.startswith(prefix):
+                        return zip_mime
+            return mime
+    if header[:4] == b'RIFF' and header[8:12] in _RIFF_TYPES:
+        return _RIFF_TYPES[header[8:12]]
+    if header[4:8] == b'ftyp':
+        return _FTYP_BRANDS.get(header[8:12], 'video/mp4')
+    if not header:
+        return 'application/x-empty'
+    if b'\x00' not in header:
+        try:
+            header.decode('utf-8')
+            return 'text/plain'
+        except UnicodeDecodeError:
+            # 途中で切れたマルチバイト文字は許容
+            try:
+                header[:-3].decode('utf-8')
+                return 'text/plain'
+            except UnicodeDecodeError:
+                pass
+    return 'application/octet-stream'
+
+
+class SignatureCache:
+    """先頭バイト判定結果のキャッシュ（(パス, 更新日時, サイズ) が同じなら再読込しない）"""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            mime = self._entries.get(key)
+            if mime is not None:
+                self._entries.move_to_end(key)
+            return mime
+
+    def put(self, key, mime):
+        with self._lock:
+            self._entries[key] = mime
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class FileProbe:
+    """1ファイル分の遅延評価付き属性（stat・MIME タイプは最初に参照した時だけ取得）"""
+
+    def __init__(self, path, cache=None, st=None):
+        self.path = os.fspath(path)
+        self.cache = cache
+        self._stat = st
+        self._mime = None
+
+    @property
+    def stat(self):
+        """os.stat の結果"""
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    @property
+    def size(self):
+        return self.stat.st_size
+
+    @property
+    def age(self):
+        """最終更新からの経過秒数"""
+        return time.time() - self.stat.st_mtime
+
+    @property
+    def mime(self):
+        """先頭バイトから判定した MIME タイプ"""
+        if self._mime is None:
+            st = self.stat
+            key = (self.path, st.st_mtime_ns, st.st_size)
+            mime = self.cache.get(key) if self.cache is not None else None
+            if mime is None:
+                with open(self.path, 'rb') as f:
+                    mime = detect_mime(f.read(HEADER_SIZE))
+                if self.cache is not None:
+                    self.cache.put(key, mime)
+            self._mime = mime
+        return self._mime
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+書き込み完了判定
+stat() のサイズ・更新時刻が一定時間変化しないこと、排他オープンできることを確認する
+"""
+
+import os
+import threading
+import time
+
+# 判定結果
+READY = "ready"        # 書き込み完了
+WAITING = "waiting"    # 書き込み中（再確認が必要）
+GONE = "gone"          # ファイルが消えた（リネーム・削除済み）
+TIMEOUT = "timeout"    # 待機上限を超えた
+
+# ブラウザ等が書き込み中に使う一時ファイルの拡張子
+DEFAULT_PARTIAL_EXTENSIONS = [
+    ".crdownload",   # Chrome / Edge
+    ".part",         # Firefox
+    ".partial",      # Edge (旧)
+    ".download",     # Safari
+    ".opdownload",   # Opera
+    ".tmp",
+]
+
+
+class WriteCompletionDetector:
+    """ファイルの書き込み完了を検出する"""
+
+    def __init__(self, stable_seconds=2.0, poll_interval=0.5, timeout=3600,
+                 partial_extensions=None):
+        self.stable_seconds = float(stable_seconds)
+        self.poll_interval = float(poll_interval)
+        self.timeout = float(timeout)
+        if partial_extensions is None:
+            partial_extensions = DEFAULT_PARTIAL_EXTENSIONS
+        self.partial_extensions = tuple(ext.lower() for ext in partial_extensions)
+
+        # パス -> [サイズ, 更新時刻(ns), 安定開始時刻, 初回確認時刻]
+        self._states = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """設定辞書から生成（旧設定の delay_seconds を安定判定時間として引き継ぐ）"""
+        readiness = config.get('readiness', {})
+        return cls(
+            stable_seconds=readiness.get('stable_seconds', config.get('delay_seconds', 2)),
+            poll_interval=readiness.get('poll_interval', 0.5),
+            timeout=readiness.get('timeout', 3600),
+            partial_extensions=readiness.get('partial_extensions')
+        )
+
+    def is_partial(self, path):
+        """ダウンロード途中の一時ファイルかどうか"""
+        return str(path).lower().endswith(self.partial_extensions)
+
+    def check(self, path):
+        """書き込み状態を1回確認して判定結果を返す"""
+        key = str(path)
+        try:
+            st = os.stat(key)
+        except FileNotFoundError:
+            self.forget(key)
+            return GONE
+
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                # 既に stable_seconds 以上更新されていなければ最初から安定扱い
+                idle = max(0.0, time.time() - st.st_mtime)
+                stable_since = now - idle
+                state = [st.st_size, st.st_mtime_ns, stable_since, now]
+                self._states[key] = state
+            elif state[0] != st.st_size or state[1] != st.st_mtime_ns:
+                state[0] = st.st_size
+                state[1] = st.st_mtime_ns
+                state[2] = now
+
+            if now - state[3] > self.timeout:
+                del self._states[key]
+                return TIMEOUT
+            if now - state[2] < self.stable_seconds:
+                return WAITING
+
+        if not self._can_open_exclusive(key):
+            return WAITING
+
+        self.forget(key)
+        return READY
+
+    def forget(self, path):
+        """追跡中の状態を破棄"""
+        with self._lock:
+            self._states.pop(str(path), None)
+
+    def _can_open_exclusive(self, path):
+        """他プロセスが書き込み中でないか（書き込みモードで開けるか）を確認"""
+        if not os.access(path, os.W_OK):
+            # 読み取り専用ファイルは開けないので安定判定のみで良しとする
+            return True
+        try:
+            with open(path, 'r+b'):
+                pass
+            return True
+        except PermissionError:
+            # Windowsでは書き込み中のファイルは共有違反になる
+            return False
+        except OSError:
+            return False
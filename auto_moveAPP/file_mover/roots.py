@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+監視フォルダ（ルート）の管理
+複数フォルダを1つのオブザーバーで監視し、フォルダごとのルールを引き当てる
+
+設定例:
+    "watch_folder": "~/Downloads",            ← 従来どおりの主フォルダ（トップレベルの rules を使用）
+    "watch_roots": [
+        {"path": "~/Desktop"},                 ← rules 省略時はトップレベルの rules を使用
+        {"path": "D:/Scan", "recursive": true, "rules": [...]}
+    ]
+"""
+
+import json
+import os
+from pathlib import Path
+
+from file_mover.rules import CompiledRules
+
+
+def normalize_path(path):
+    """比較用に正規化したパス"""
+    return os.path.normcase(os.path.abspath(os.path.expanduser(str(path))))
+
+
+def resolve_destination(rule):
+    """ルールの移動先パス（相対パスはホームディレクトリ基準、未指定なら None）"""
+    destination = rule.get('destination', '')
+    if not destination:
+        return None
+    if os.path.isabs(destination):
+        return Path(destination)
+    return Path.home() / destination
+
+
+class WatchRoot:
+    """監視フォルダ1つ分の設定"""
+
+    def __init__(self, path, recursive, rules):
+        self.path = os.path.abspath(os.path.expanduser(str(path)))
+        self.key = normalize_path(path)
+        self.recursive = recursive
+        self.rules = rules
+
+
+class WatchRootSet:
+    """監視フォルダ一覧（ルールのコンパイルは同じ内容なら1回だけ）"""
+
+    def __init__(self, config, logger=None, previous=None):
+        compiled_cache = {}
+        previous_cache = previous._compiled if previous is not None else {}
+        # 変更されたルール一覧は、前回の既定ルールから変更のないルールの解析結果を引き継ぐ
+        previous_default = previous.default_rules if previous is not None else None
+
+        def compile_once(rules):
+            key = json.dumps(rules, sort_keys=True, ensure_ascii=False)
+            if key not in compiled_cache:
+                compiled_cache[key] = previous_cache.get(key) or CompiledRules(
+                    rules, logger=logger, previous=previous_default)
+            return compiled_cache[key]
+
+        default_rules = compile_once(config.get('rules', []))
+        self.default_rules = default_rules
+
+        roots = {}
+        watch_folder = config.get('watch_folder', os.path.expanduser("~/Downloads"))
+        if watch_folder:
+            root = WatchRoot(watch_folder, config.get('watch_recursive', False), default_rules)
+            roots[root.key] = root
+        for entry in config.get('watch_roots', []):
+            if not entry.get('path'):
+                continue
+            rules = compile_once(entry['rules']) if 'rules' in entry else default_rules
+            root = WatchRoot(entry['path'], entry.get('recursive', False), rules)
+            roots.setdefault(root.key, root)
+
+        # 深い（長い）パスを優先して判定する
+        self.roots = sorted(roots.values(), key=lambda r: len(r.key), reverse=True)
+
+        # 再帰監視で移動先フォルダのファイルを再処理しないよう、移動先を控えておく
+        destinations = set()
+        for compiled in compiled_cache.values():
+            for rule in compiled.rules:
+                dest_path = resolve_destination(rule)
+                if dest_path is not None:
+                    destinations.add(normalize_path(dest_path))
+        self.destinations = destinations
+        self._compiled = compiled_cache
+
+    def __iter__(self):
+        return iter(self.roots)
+
+    def root_for(self, file_path):
+        """ファイルを含む監視フォルダ（該当なしは None）"""
+        parent = os.path.dirname(normalize_path(file_path))
+        for root in self.roots:
+            if parent == root.key:
+                return root
+            if root.recursive and parent.startswith(root.key + os.sep):
+                if self._in_destination(parent):
+                    return None
+                return root
+        return None
+
+    def rules_for(self, file_path):
+        """ファイルに適用するルール（監視フォルダ外なら None）"""
+        root = self.root_for(file_path)
+        return root.rules if root else None
+
+    def _in_destination(self, directory):
+        """移動先フォルダ（またはその配下）かどうか"""
+        for dest in self.destinations:
+            if directory == dest or directory.startswith(dest + os.sep):
+                return True
+        return False
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+振り分けルールのコンパイル
+設定読み込み時に一度だけ検索用の構造を作り、ファイルごとの線形走査をなくす
+
+- `.*\\.(pdf|docx)$` 形式の拡張子ルール → 拡張子をキーにした辞書
+- `.*kaunet_.*` 形式の部分一致ルール → 小文字化した文字列の `in` 判定
+- それ以外 → 名前付きグループの選択(|)でまとめた1本の正規表現
+いずれも「先に定義されたルールが優先」という従来の挙動を保つ
+（改行を含む名前は `.` と `$` の扱いが変わるため、拡張子・部分一致ルールも正規表現で判定する）
+
+ファイル内容の条件（min_size / max_size / min_age_hours / max_age_hours / mime）付きのルールは
+名前 → stat → 先頭バイトの順に必要な分だけ調べる
+"""
+
+import fnmatch
+import json
+import logging
+import re
+
+from file_mover.probe import parse_size
+
+# `.*\.ext$` / `.*\.(ext1|ext2)$` 形式の拡張子ルール
+_EXTENSION_PATTERN = re.compile(
+    r'^\^?\.\*\\\.(?:\((?P<group>[A-Za-z0-9_]+(?:\|[A-Za-z0-9_]+)*)\)|(?P<single>[A-Za-z0-9_]+))\$$'
+)
+
+# `.*文字列.*` 形式の部分一致ルール
+_SUBSTRING_PATTERN = re.compile(r'^\^?\.\*(?P<literal>(?:[^.^$*+?{}\[\]\\|()]|\\[^A-Za-z0-9])*)\.\*\$?$')
+
+# 1本の正規表現にまとめると意味が変わる要素（後方参照・名前付きグループ・インラインフラグ）
+_NOT_COMBINABLE = re.compile(r'\\[1-9]|\(\?P[<=]|\(\?[aiLmsux]+\)')
+
+
+def parse_extension_pattern(pattern):
+    """拡張子ルールなら小文字の拡張子リストを返す（それ以外は None）"""
+    m = _EXTENSION_PATTERN.match(pattern)
+    if not m:
+        return None
+    extensions = m.group('group') or m.group('single')
+    return [ext.lower() for ext in extensions.split('|')]
+
+
+def parse_substring_pattern(pattern):
+    """部分一致ルールなら小文字の検索文字列を返す（それ以外は None）"""
+    if pattern in ('.*', '^.*', '.*$', '^.*$'):
+        # すべてにマッチするルール
+        return ''
+    m = _SUBSTRING_PATTERN.match(pattern)
+    if not m:
+        return None
+    literal = re.sub(r'\\(.)', r'\1', m.group('literal'))
+    # 大文字小文字の区別がある非ASCII文字は IGNORECASE と lower() で結果が変わり得る
+    if not all(c.isascii() or c.lower() == c.upper() for c in literal):
+        return None
+    return literal.lower()
+
+
+def compile_conditions(rule):
+    """ルールの内容条件を安い順（stat → 先頭バイト）の判定関数リストにする（条件なしは None）"""
+    conditions = []
+    if 'min_size' in rule:
+        min_size = parse_size(rule['min_size'])
+        conditions.append(lambda probe: probe.size >= min_size)
+    if 'max_size' in rule:
+        max_size = parse_size(rule['max_size'])
+        conditions.append(lambda probe: probe.size <= max_size)
+    if 'min_age_hours' in rule:
+        min_age = float(rule['min_age_hours']) * 3600
+        conditions.append(lambda probe: probe.age >= min_age)
+    if 'max_age_hours' in rule:
+        max_age = float(rule['max_age_hours']) * 3600
+        conditions.append(lambda probe: probe.age <= max_age)
+    if 'mime' in rule:
+        mime = rule['mime']
+        patterns = [p.lower() for p in ([mime] if isinstance(mime, str) else mime)]
+        conditions.append(lambda probe: any(fnmatch.fnmatchcase(probe.mime, p) for p in patterns))
+    return conditions or None
+
+
+class CompiledRules:
+    """コンパイル済みの振り分けルール（生成後は変更しない）"""
+
+    def __init__(self, rules, logger=None, previous=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.rules = [dict(rule) for rule in rules]
+
+        # 拡張子 -> 最優先ルールの番号
+        self._by_extension = {}
+        # 部分一致ルール [(ルール番号, 小文字の検索文字列)]
+        self._substrings = []
+        # 拡張子・部分一致ルールの正規表現 [(ルール番号, コンパイル済み正規表現)]（改行を含む名前用）
+        self._literal_regexes = []
+        # まとめた正規表現のグループ番号 -> ルール番号
+        self._group_to_rule = {}
+        self._combined = None
+        # まとめられないルール [(ルール番号, コンパイル済み正規表現)]
+        self._standalone = []
+        # 内容条件付きのルール [(ルール番号, 名前の正規表現または None, 判定関数リスト)]
+        self._conditional = []
+
+        # ルール（JSON文字列）→ 解析結果。再コンパイル時は変更のないルールの解析結果を使い回す
+        self._parsed = {}
+        self._combined_key = None
+        self.reused_count = 0
+
+        self._compile(previous)
+
+    @staticmethod
+    def _rule_key(rule):
+        """ルールの同一判定用キー"""
+        return json.dumps(rule, sort_keys=True, ensure_ascii=False)
+
+    def _parse_rule(self, rule):
+        """1ルール分の解析（不正なルールは None）"""
+        pattern = rule.get('pattern', '')
+        try:
+            conditions = compile_conditions(rule)
+        except (TypeError, ValueError) as e:
+            self.logger.error(f"ルールの条件が不正です: {rule.get('name', '')}: {e}")
+            return None
+        if conditions:
+            # 名前の判定は個別に行い、マッチした時だけ内容を調べる
+            try:
+                matcher = re.compile(pattern, re.IGNORECASE) if pattern else None
+            except re.error as e:
+                self.logger.error(f"ルールの正規表現が不正です: {rule.get('name', '')}: {e}")
+                return None
+            return ('conditional', matcher, conditions)
+        if not pattern:
+            return None
+
+        try:
+            compiled = re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            self.logger.error(f"ルールの正規表現が不正です: {rule.get('name', '')}: {e}")
+            return None
+
+        extensions = parse_extension_pattern(pattern)
+        if extensions is not None:
+            return ('extension', extensions, compiled)
+
+        literal = parse_substring_pattern(pattern)
+        if literal is not None:
+            return ('substring', literal, compiled)
+
+        return ('regex', compiled, not _NOT_COMBINABLE.search(pattern))
+
+    def _compile(self, previous=None):
+        """検索用の構造を構築（previous があれば変更のないルールは再解析しない）"""
+        reuse = previous._parsed if previous is not None else {}
+        combinable = []
+        for index, rule in enumerate(self.rules):
+            key = self._rule_key(rule)
+            if key in reuse:
+                parsed = reuse[key]
+                self.reused_count += 1
+            else:
+                parsed = self._parse_rule(rule)
+            self._parsed[key] = parsed
+            if parsed is None:
+                continue
+
+            kind = parsed[0]
+            if kind == 'conditional':
+                self._conditional.append((index, parsed[1], parsed[2]))
+            elif kind == 'extension':
+                for ext in parsed[1]:
+                    self._by_extension.setdefault(ext, index)
+                self._literal_regexes.append((index, parsed[2]))
+            elif kind == 'substring':
+                self._substrings.append((index, parsed[1]))
+                self._literal_regexes.append((index, parsed[2]))
+            elif parsed[2]:
+                combinable.append((index, rule['pattern'], parsed[1].groups))
+            else:
+                self._standalone.append((index, parsed[1]))
+
+        if combinable:
+            self._combined_key = tuple((index, pattern) for index, pattern, _ in combinable)
+            if (previous is not None and previous._combined is not None
+                    and previous._combined_key == self._combined_key):
+                # まとめた正規表現に入るルールが同じなら前回のものをそのまま使う
+                self._combined = previous._combined
+                self._group_to_rule = previous._group_to_rule
+                return
+            parts = []
+            group_number = 1
+            for index, pattern, groups in combinable:
+                parts.append(f"(?P<r{index}>{pattern})")
+                self._group_to_rule[group_number] = index
+                group_number += groups + 1
+            try:
+                self._combined = re.compile('|'.join(parts), re.IGNORECASE)
+            except re.error as e:
+                # 念のため：まとめられない場合は個別に評価する
+                self.logger.warning(f"ルールの一括コンパイルに失敗したため個別評価します: {e}")
+                self._group_to_rule = {}
+                for index, pattern, _ in combinable:
+                    self._standalone.append((index, re.compile(pattern, re.IGNORECASE)))
+                self._standalone.sort()
+
+    def __len__(self):
+        return len(self.rules)
+
+    def find_index(self, file_name, probe=None):
+        """最初にマッチするルールの番号を返す（なければ None）
+
+        probe（FileProbe）を渡さない場合、内容条件付きのルールはマッチしない
+        """
+        best = None
+
+        if '\n' in file_name:
+            # `.` は改行にマッチせず `$` は末尾の改行の前でもマッチするので、文字列の比較では判定できない
+            for index, compiled in self._literal_regexes:
+                if compiled.match(file_name):
+                    best = index
+                    break
+        else:
+            _, dot, ext = file_name.rpartition('.')
+            if dot:
+                best = self._by_extension.get(ext.lower())
+
+            if self._substrings:
+                lowered = file_name.lower()
+                for index, literal in self._substrings:
+                    if best is not None and index >= best:
+                        break
+                    if literal in lowered:
+                        best = index
+                        break
+
+        if self._combined is not None:
+            m = self._combined.match(file_name)
+            if m:
+                index = self._group_to_rule[m.lastindex]
+                if best is None or index < best:
+                    best = index
+
+        for index, compiled in self._standalone:
+            if best is not None and index >= best:
+                break
+            if compiled.match(file_name):
+                best = index
+                break
+
+        if probe is not None:
+            for index, matcher, conditions in self._conditional:
+                if best is not None and index >= best:
+                    break
+                if matcher is not None and not matcher.match(file_name):
+                    continue
+                if self._check_conditions(conditions, probe):
+                    best = index
+                    break
+
+        return best
+
+    def _check_conditions(self, conditions, probe):
+        """内容条件をすべて満たすか（途中で満たさなければ以降は調べない）"""
+        try:
+            return all(condition(probe) for condition in conditions)
+        except OSError as e:
+            self.logger.debug(f"ファイル内容を確認できません: {probe.path}: {e}")
+            return False
+
+    def find(self, file_name, probe=None):
+        """最初にマッチするルールを返す（なければ None）"""
+        index = self.find_index(file_name, probe)
+        return None if index is None else self.rules[index]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+ヘッドレス監視サービス
+GUI（tkinter / pystray / Pillow）を使わずに監視のみ行う常駐用エントリーポイント
+Linux やコンテナ上でも動作する
+
+使い方:
+    python -m file_mover --headless --config config.json
+    python file_mover_gui.py --headless
+"""
+
+import argparse
+import signal
+import sys
+import threading
+
+from watchdog.observers import Observer
+
+from file_mover.core import FileAutoMover
+
+
+class HeadlessService:
+    """FileAutoMover とオブザーバーだけで構成する監視サービス"""
+
+    def __init__(self, config_file="config.json"):
+        self.mover = FileAutoMover(config_file=config_file)
+        self.logger = self.mover.logger
+        self.observer = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """監視開始"""
+        self.observer = Observer()
+        folders = self.mover.schedule_watches(self.observer)
+        if not folders:
+            self.observer = None
+            raise FileNotFoundError("監視フォルダが存在しません")
+
+        self.mover.start()
+        self.observer.start()
+        for folder in folders:
+            self.logger.info(f"監視開始（ヘッドレス）: {folder}")
+
+    def stop(self):
+        """監視停止"""
+        self._stop_event.set()
+
+    def run(self):
+        """停止要求（SIGINT / SIGTERM）まで監視を続ける"""
+        self.start()
+        try:
+            while not self._stop_event.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.observer:
+                self.observer.stop()
+                self.observer.join()
+                self.observer = None
+            self.mover.stop()
+            self.logger.info("監視停止（ヘッドレス）")
+
+
+def main(argv=None):
+    """ヘッドレスモードで起動"""
+    parser = argparse.ArgumentParser(description="ダウンロードフォルダ自動振り分け（ヘッドレス）")
+    parser.add_argument('--headless', action='store_true', help="GUIなしで起動（指定しなくても同じ）")
+    parser.add_argument('--startup', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--config', default="config.json", help="設定ファイル")
+    args = parser.parse_args(argv)
+
+    service = HeadlessService(config_file=args.config)
+
+    def handle_signal(signum, frame):
+        service.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, handle_signal)
+
+    try:
+        service.run()
+    except FileNotFoundError as e:
+        service.logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+設定のスナップショットと config.json の変更監視
+設定とコンパイル済みルールをまとめた不変のスナップショットを参照の差し替えで切り替えるため、
+処理中のスレッドが更新途中の設定を見ることはない
+"""
+
+import copy
+import os
+import threading
+from types import MappingProxyType
+
+from watchdog.events import FileSystemEventHandler
+
+from file_mover.roots import WatchRootSet
+
+
+def rule_source_of(config):
+    """コンパイル結果に影響する設定項目"""
+    return (config.get('watch_folder'), config.get('watch_recursive', False),
+            config.get('rules', []), config.get('watch_roots', []))
+
+
+class ConfigSnapshot:
+    """ある版の設定とコンパイル済みルール（生成後は変更しない）"""
+
+    def __init__(self, config, version=1, previous=None, logger=None):
+        self.version = version
+        # 呼び出し側が元の辞書を書き換えても影響しないよう複製して読み取り専用にする
+        self.config = MappingProxyType(copy.deepcopy(dict(config)))
+        self.rules_source = rule_source_of(self.config)
+        if previous is not None and previous.rules_source == self.rules_source:
+            self.watch_roots = previous.watch_roots
+        else:
+            self.watch_roots = WatchRootSet(
+                self.config, logger=logger,
+                previous=previous.watch_roots if previous is not None else None)
+        self.compiled_rules = self.watch_roots.default_rules
+
+    def changed_sections(self, other):
+        """other と値が異なる設定項目名の集合"""
+        keys = set(self.config) | set(other.config)
+        return {key for key in keys if self.config.get(key) != other.config.get(key)}
+
+
+class ConfigFileWatcher(FileSystemEventHandler):
+    """config.json の変更を検出して再読み込みする（連続する書き込みは1回にまとめる）"""
+
+    def __init__(self, config_file, reload_callback, delay=0.5):
+        self.config_file = os.path.normcase(os.path.abspath(config_file))
+        self.directory = os.path.dirname(self.config_file)
+        self.reload_callback = reload_callback
+        self.delay = delay
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        paths = [event.src_path, getattr(event, 'dest_path', '')]
+        if any(path and os.path.normcase(os.path.abspath(path)) == self.config_file for path in paths):
+            self._schedule()
+
+    def _schedule(self):
+        """最後の変更から delay 秒後に再読み込み（監視スレッドでは読み込まない）"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self.reload_callback)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        """予約中の再読み込みを取り消す"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
@@ -3,298 +3,39 @@
 """
 ダウンロードフォルダ自動振り分けアプリ（GUI版）
 設定画面とスタートアップ設定機能付き
+
+--headless を付けて起動すると GUI（tkinter / pystray / Pillow）を読み込まずに
+バックグラウンドで監視のみ行う（python -m file_mover と同じ）
 """
 
 import os
-import json
 import time
-import shutil
-import logging
-import hashlib
 import threading
 import subprocess
-from pathlib import Path
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-import re
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
 import sys
-import pystray
-from PIL import Image, ImageDraw
+import copy
+from collections import deque
+from watchdog.observers import Observer
+from file_mover.core import FileAutoMover
+from file_mover.backfill import BackfillRunner
 
-class FileAutoMover(FileSystemEventHandler):
-    """ファイル自動移動ハンドラー"""
-    
-    def __init__(self, config_file="config.json", log_callback=None):
-        self.config_file = config_file
-        self.log_callback = log_callback
-        self.config = self.load_config()
-        self.setup_logging()
-        
-    def load_config(self):
-        """設定ファイルを読み込み"""
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                # デフォルト設定を作成
-                default_config = {
-                    "watch_folder": os.path.expanduser("~/Downloads"),
-                    "rules": [
-                        {
-                            "name": "kaunetファイル",
-                            "pattern": ".*kaunet_.*",
-                            "destination": "C:/LocalApp/kaunetAPP/DATA",
-                            "action": "move"
-                        },
-                        {
-                            "name": "PDFファイル",
-                            "pattern": ".*\\.pdf$",
-                            "destination": "Documents/PDF",
-                            "action": "move"
-                        },
-                        {
-                            "name": "画像ファイル",
-                            "pattern": ".*\\.(jpg|jpeg|png|gif|bmp|webp)$",
-                            "destination": "Pictures/Downloads",
-                            "action": "move"
-                        },
-                        {
-                            "name": "動画ファイル",
-                            "pattern": ".*\\.(mp4|avi|mkv|mov|wmv|flv|webm)$",
-                            "destination": "Videos/Downloads",
-                            "action": "move"
-                        },
-                        {
-                            "name": "音楽ファイル",
-                            "pattern": ".*\\.(mp3|wav|flac|aac|ogg|m4a)$",
-                            "destination": "Music/Downloads",
-                            "action": "move"
-                        },
-                        {
-                            "name": "実行ファイル",
-                            "pattern": ".*\\.(exe|msi|app)$",
-                            "destination": "Programs",
-                            "action": "move"
-                        },
-                        {
-                            "name": "圧縮ファイル",
-                            "pattern": ".*\\.(zip|rar|7z|tar|gz)$",
-                            "destination": "Downloads/Archives",
-                            "action": "move"
-                        },
-                        {
-                            "name": "ドキュメント",
-                            "pattern": ".*\\.(doc|docx|txt|rtf|xls|xlsx|ppt|pptx)$",
-                            "destination": "Documents/Downloads",
-                            "action": "move"
-                        },
-                        {
-                            "name": "その他のファイル",
-                            "pattern": ".*",
-                            "destination": "Downloads/Others",
-                            "action": "move"
-                        }
-                    ],
-                    "log_level": "INFO",
-                    "delay_seconds": 3,
-                    "create_directories": True,
-                    "safe_move": {
-                        "enabled": True,
-                        "hash_check_threshold": 104857600,
-                        "verify_integrity": True
-                    }
-                }
-                self.save_config(default_config)
-                return default_config
-        except Exception as e:
-            print(f"設定ファイル読み込みエラー: {e}")
-            return {}
-    
-    def save_config(self, config):
-        """設定ファイルを保存"""
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"設定ファイル保存エラー: {e}")
-    
-    def setup_logging(self):
-        """ログ設定"""
-        log_level = getattr(logging, self.config.get('log_level', 'INFO').upper())
-        logging.basicConfig(
-            level=log_level,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('file_mover.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
-        self.logger = logging.getLogger(__name__)
-    
-    def on_created(self, event):
-        """ファイル作成時のイベント処理"""
-        if not event.is_directory:
-            time.sleep(self.config.get('delay_seconds', 2))
-            self.process_file(event.src_path)
-    
-    def on_moved(self, event):
-        """ファイル移動時のイベント処理"""
-        if not event.is_directory:
-            time.sleep(self.config.get('delay_seconds', 2))
-            self.process_file(event.dest_path)
-    
-    def process_file(self, file_path):
-        """ファイル処理メインロジック"""
-        try:
-            file_path = Path(file_path)
-            if not file_path.exists():
-                self.logger.warning(f"ファイルが存在しません: {file_path}")
-                return
-            
-            file_name = file_path.name
-            self.logger.info(f"処理開始: {file_name}")
-            
-            # ルールに基づいて振り分け
-            for rule in self.config.get('rules', []):
-                if self.match_rule(file_name, rule):
-                    self.execute_rule(file_path, rule)
-                    break
-            else:
-                self.logger.info(f"マッチするルールがありません: {file_name}")
-                
-        except Exception as e:
-            self.logger.error(f"ファイル処理エラー: {e}")
-    
-    def match_rule(self, file_name, rule):
-        """ルールにマッチするかチェック"""
-        try:
-            pattern = rule.get('pattern', '')
-            if pattern:
-                return re.match(pattern, file_name, re.IGNORECASE) is not None
-        except Exception as e:
-            self.logger.error(f"ルールマッチングエラー: {e}")
-        return False
-    
-    def execute_rule(self, file_path, rule):
-        """ルール実行"""
-        try:
-            destination = rule.get('destination', '')
-            action = rule.get('action', 'move')
-            
-            if not destination:
-                self.logger.warning("移動先が指定されていません")
-                return
-            
-            # 移動先パスの構築
-            if os.path.isabs(destination):
-                dest_path = Path(destination)
-            else:
-                base_path = Path.home()
-                dest_path = base_path / destination
-            
-            dest_file_path = dest_path / file_path.name
-            
-            # ディレクトリ作成
-            if self.config.get('create_directories', True):
-                dest_path.mkdir(parents=True, exist_ok=True)
-            
-            # ファイル移動/コピー
-            if action == 'move':
-                if dest_file_path.exists():
-                    dest_file_path = self.get_unique_filename(dest_file_path)
-                
-                # 安全な移動を実行
-                if self.safe_move(file_path, dest_file_path):
-                    self.logger.info(f"安全移動完了: {file_path.name} -> {dest_path}")
-                    if self.log_callback:
-                        self.log_callback(f"移動完了: {file_path.name}")
-                else:
-                    self.logger.error(f"安全移動失敗: {file_path.name}")
-                    if self.log_callback:
-                        self.log_callback(f"移動失敗: {file_path.name}")
-                
-            elif action == 'copy':
-                if dest_file_path.exists():
-                    dest_file_path = self.get_unique_filename(dest_file_path)
-                
-                shutil.copy2(str(file_path), str(dest_file_path))
-                self.logger.info(f"コピー完了: {file_path.name} -> {dest_path}")
-                if self.log_callback:
-                    self.log_callback(f"コピー完了: {file_path.name}")
-                
-        except Exception as e:
-            self.logger.error(f"ルール実行エラー: {e}")
-    
-    def safe_move(self, src_path, dst_path):
-        """安全な移動（コピー→整合性確認→元ファイル削除）"""
-        try:
-            src_path = Path(src_path)
-            dst_path = Path(dst_path)
-            
-            # 1. ファイルサイズを取得
-            src_size = src_path.stat().st_size
-            
-            # 2. コピー実行
-            shutil.copy2(str(src_path), str(dst_path))
-            
-            # 3. ファイルサイズ確認
-            dst_size = dst_path.stat().st_size
-            if src_size != dst_size:
-                self.logger.error(f"ファイルサイズ不一致: 元={src_size}, 先={dst_size}")
-                dst_path.unlink()
-                return False
-            
-            # 4. ファイルハッシュ確認（小さいファイルのみ）
-            if src_size < 100 * 1024 * 1024:  # 100MB未満の場合のみハッシュ確認
-                src_hash = self.calculate_file_hash(src_path)
-                dst_hash = self.calculate_file_hash(dst_path)
-                
-                if src_hash != dst_hash:
-                    self.logger.error(f"ファイルハッシュ不一致: {src_path.name}")
-                    dst_path.unlink()
-                    return False
-            
-            # 5. 元ファイル削除
-            src_path.unlink()
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"安全移動エラー: {e}")
-            try:
-                if dst_path.exists():
-                    dst_path.unlink()
-            except:
-                pass
-            return False
-    
-    def calculate_file_hash(self, file_path):
-        """ファイルのハッシュ値を計算"""
-        hash_md5 = hashlib.md5()
-        try:
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
-        except Exception as e:
-            self.logger.error(f"ハッシュ計算エラー: {e}")
-            return ""
-    
-    def get_unique_filename(self, file_path):
-        """重複しないファイル名を生成"""
-        base_path = file_path.parent
-        name = file_path.stem
-        suffix = file_path.suffix
-        counter = 1
-        
-        while file_path.exists():
-            new_name = f"{name}_{counter}{suffix}"
-            file_path = base_path / new_name
-            counter += 1
-        
-        return file_path
+# GUIモジュールは GUI 起動時にのみ読み込む（_load_gui_modules 参照）
+tk = ttk = messagebox = filedialog = None
+pystray = Image = ImageDraw = None
+
+# ログ表示の更新間隔（ミリ秒）
+LOG_DRAIN_INTERVAL_MS = 100
+
+# 処理状況（メトリクス）表示の更新間隔
+METRICS_REFRESH_INTERVAL_MS = 1000
+
+def _load_gui_modules():
+    """tkinter / pystray / Pillow を読み込む"""
+    global tk, ttk, messagebox, filedialog, pystray, Image, ImageDraw
+    import tkinter as tk
+    from tkinter import ttk, messagebox, filedialog
+    import pystray
+    from PIL import Image, ImageDraw
 
 class FileMoverGUI:
     """メインGUIアプリケーション"""
@@ -311,12 +52,20 @@ class FileMoverGUI:
         self.monitoring = False
         self.tray_icon = None
         self.minimize_to_tray = True
+        self.backfill_runner = None
+        
+        # ログ表示：ワーカースレッドはキューに積むだけで、表示はメインスレッドでまとめて行う
+        self.log_max_lines = 100
+        self.log_queue = deque(maxlen=self.log_max_lines)
+        self.log_line_count = 0
         
         # GUI構築
         self.create_widgets()
         
         # 設定読み込み
         self.load_settings()
+        self.root.after(LOG_DRAIN_INTERVAL_MS, self.drain_log_queue)
+        self.root.after(METRICS_REFRESH_INTERVAL_MS, self.refresh_metrics)
         
         # システムトレイアイコン作成
         self.create_tray_icon()
@@ -343,6 +92,9 @@ class FileMoverGUI:
         self.status_label = ttk.Label(status_frame, text="停止中")
         self.status_label.pack(side=tk.LEFT)
         
+        self.metrics_label = ttk.Label(status_frame, text="")
+        self.metrics_label.pack(side=tk.RIGHT)
+        
         # 制御ボタン
         control_frame = ttk.Frame(main_frame)
         control_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -353,6 +105,9 @@ class FileMoverGUI:
         self.stop_button = ttk.Button(control_frame, text="監視停止", command=self.stop_monitoring, state=tk.DISABLED)
         self.stop_button.pack(side=tk.LEFT, padx=(0, 5))
         
+        self.backfill_button = ttk.Button(control_frame, text="既存ファイルを振り分け", command=self.start_backfill)
+        self.backfill_button.pack(side=tk.LEFT, padx=(0, 5))
+        
         # ログ表示エリア
         log_frame = ttk.LabelFrame(main_frame, text="ログ", padding="5")
         log_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
@@ -374,6 +129,8 @@ class FileMoverGUI:
         """設定読み込み"""
         try:
             self.mover = FileAutoMover(log_callback=self.log_callback)
+            self.log_max_lines = max(1, int(self.mover.config.get('gui_log_lines', 100)))
+            self.log_queue = deque(self.log_queue, maxlen=self.log_max_lines)
             self.log_callback("設定を読み込みました")
         except Exception as e:
             messagebox.showerror("エラー", f"設定の読み込みに失敗しました: {e}")
@@ -385,26 +142,30 @@ class FileMoverGUI:
                 messagebox.showerror("エラー", "設定が読み込まれていません")
                 return
             
-            watch_folder = self.mover.config.get('watch_folder', os.path.expanduser("~/Downloads"))
+            # オブザーバー設定（全監視フォルダを1つのオブザーバーで監視）
+            self.observer = Observer()
+            folders = self.mover.schedule_watches(self.observer)
             
-            if not os.path.exists(watch_folder):
-                messagebox.showerror("エラー", f"監視フォルダが存在しません: {watch_folder}")
+            if not folders:
+                self.observer = None
+                messagebox.showerror("エラー", "監視フォルダが存在しません")
                 return
             
-            # オブザーバー設定
-            self.observer = Observer()
-            self.observer.schedule(self.mover, watch_folder, recursive=False)
+            # 処理パイプライン開始
+            self.mover.start()
             
             # 監視開始
             self.observer.start()
             self.monitoring = True
             
             # UI更新
-            self.status_label.config(text=f"監視中: {watch_folder}")
+            status = folders[0] if len(folders) == 1 else f"{folders[0]} 他{len(folders) - 1}件"
+            self.status_label.config(text=f"監視中: {status}")
             self.start_button.config(state=tk.DISABLED)
             self.stop_button.config(state=tk.NORMAL)
             
-            self.log_callback(f"監視開始: {watch_folder}")
+            for folder in folders:
+                self.log_callback(f"監視開始: {folder}")
             
         except Exception as e:
             messagebox.showerror("エラー", f"監視開始に失敗しました: {e}")
@@ -412,11 +173,20 @@ class FileMoverGUI:
     def stop_monitoring(self):
         """監視停止"""
         try:
+            # 一括振り分けを中断し、処理中のファイルが終わるまで待つ（ジャーナル・重複索引を閉じる前に）
+            runner = self.backfill_runner
+            if runner:
+                runner.stop()
+                runner.wait()
+            
             if self.observer:
                 self.observer.stop()
                 self.observer.join()
                 self.observer = None
             
+            if self.mover:
+                self.mover.stop()
+            
             self.monitoring = False
             
             # UI更新
@@ -429,18 +199,82 @@ class FileMoverGUI:
         except Exception as e:
             messagebox.showerror("エラー", f"監視停止に失敗しました: {e}")
     
-    def log_callback(self, message):
-        """ログコールバック"""
-        timestamp = time.strftime("%H:%M:%S")
-        log_message = f"[{timestamp}] {message}\n"
+    def start_backfill(self):
+        """監視フォルダの既存ファイルを一括振り分け（別スレッドで実行）"""
+        if not self.mover:
+            messagebox.showerror("エラー", "設定が読み込まれていません")
+            return
+        if self.backfill_runner:
+            messagebox.showinfo("情報", "既存ファイルの振り分けを実行中です")
+            return
         
-        self.log_text.insert(tk.END, log_message)
-        self.log_text.see(tk.END)
+        folders = [root.path for root in self.mover.watch_roots if os.path.isdir(root.path)]
+        if not folders:
+            messagebox.showerror("エラー", "監視フォルダが存在しません")
+            return
+        if not messagebox.askyesno("確認", "次のフォルダにある既存ファイルをルールに従って振り分けますか？\n" + "\n".join(folders)):
+            return
         
-        # ログが多すぎる場合は古いものを削除
-        lines = self.log_text.get("1.0", tk.END).split('\n')
-        if len(lines) > 100:
-            self.log_text.delete("1.0", f"{len(lines)-100}.0")
+        self.backfill_runner = BackfillRunner(self.mover, progress_callback=self.log_callback)
+        self.backfill_button.config(state=tk.DISABLED)
+        threading.Thread(target=self._run_backfill, daemon=True).start()
+    
+    def _run_backfill(self):
+        """一括振り分けの実行（ワーカースレッド）"""
+        try:
+            result = self.backfill_runner.run()
+            self.log_callback(
+                f"既存ファイルの振り分け完了: {result['moved']}件成功 / {result['failed']}件失敗 "
+                f"({result['files_per_sec']:.1f} files/s, {result['mb_per_sec']:.1f} MB/s)"
+            )
+        except Exception as e:
+            self.log_callback(f"既存ファイルの振り分けエラー: {e}")
+        finally:
+            self.backfill_runner = None
+            self.root.after(0, lambda: self.backfill_button.config(state=tk.NORMAL))
+    
+    def log_callback(self, message):
+        """ログコールバック（どのスレッドからでも呼べる。表示は drain_log_queue で行う）"""
+        timestamp = time.strftime("%H:%M:%S")
+        # deque の append はスレッドセーフ。上限を超えた古い行は自動で捨てられる
+        self.log_queue.append(f"[{timestamp}] {message}")
+    
+    def drain_log_queue(self):
+        """キューに溜まったログをまとめて表示（メインスレッドで定期実行）"""
+        lines = []
+        try:
+            while True:
+                lines.append(self.log_queue.popleft())
+        except IndexError:
+            pass
+        
+        if lines:
+            self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+            self.log_line_count += len(lines)
+            
+            # ログが多すぎる場合は古いものを削除（行数はカウンタで管理し、全文は取得しない）
+            excess = self.log_line_count - self.log_max_lines
+            if excess > 0:
+                self.log_text.delete("1.0", f"{excess + 1}.0")
+                self.log_line_count -= excess
+            self.log_text.see(tk.END)
+        
+        self.root.after(LOG_DRAIN_INTERVAL_MS, self.drain_log_queue)
+    
+    def refresh_metrics(self):
+        """処理件数・転送量・工程ごとの所要時間をステータス欄に表示"""
+        if self.mover:
+            snapshot = self.mover.metrics.snapshot()
+            counters = snapshot['counters']
+            stages = snapshot['stages']
+            latency = snapshot['end_to_end']
+            self.metrics_label.config(text=(
+                f"処理 {counters['moved'] + counters['copied']}件 / 失敗 {counters['failed']}件 / "
+                f"{snapshot['bytes_moved'] / (1024 * 1024):.1f} MB | "
+                f"遅延 p50 {latency['p50']:.2f}s p99 {latency['p99']:.2f}s | "
+                f"コピー {stages['copy']['sum']:.1f}s ハッシュ {stages['hash']['sum']:.1f}s"
+            ))
+        self.root.after(METRICS_REFRESH_INTERVAL_MS, self.refresh_metrics)
     
     def open_settings(self):
         """設定画面を開く"""
@@ -453,7 +287,8 @@ class FileMoverGUI:
     def open_log(self):
         """ログファイルを開く"""
         try:
-            log_file = "file_mover.log"
+            config = self.mover.config if self.mover else {}
+            log_file = config.get('logging', {}).get('file', "file_mover.log")
             if os.path.exists(log_file):
                 os.startfile(log_file)
             else:
@@ -564,6 +399,10 @@ class FileMoverGUI:
             if self.monitoring:
                 self.stop_monitoring()
             
+            # 一括振り分け中断（再起動後に続きから処理）
+            if self.backfill_runner:
+                self.backfill_runner.stop()
+            
             # トレイアイコン停止
             if self.tray_icon:
                 self.tray_icon.stop()
@@ -598,6 +437,8 @@ class SettingsWindow:
         self.parent = parent
         self.mover = mover
         self.log_callback = log_callback
+        # ツリーの項目 ID -> 元のルール（画面にない条件を保存時に引き継ぐ）
+        self.rule_items = {}
         
         self.window = tk.Toplevel(parent)
         self.window.title("設定")
@@ -663,7 +504,7 @@ class SettingsWindow:
         other_frame.pack(fill=tk.X, pady=(0, 10))
         
         self.delay_var = tk.IntVar()
-        ttk.Label(other_frame, text="処理遅延(秒):").pack(side=tk.LEFT)
+        ttk.Label(other_frame, text="書き込み完了判定(秒):").pack(side=tk.LEFT)
         ttk.Spinbox(other_frame, from_=1, to=10, textvariable=self.delay_var, width=5).pack(side=tk.LEFT, padx=(5, 10))
         
         self.create_dirs_var = tk.BooleanVar()
@@ -688,7 +529,7 @@ class SettingsWindow:
             if self.mover and self.mover.config:
                 config = self.mover.config
                 self.folder_var.set(config.get('watch_folder', ''))
-                self.delay_var.set(config.get('delay_seconds', 3))
+                self.delay_var.set(int(self.mover.readiness.stable_seconds))
                 self.create_dirs_var.set(config.get('create_directories', True))
                 
                 # ルール一覧を更新
@@ -696,7 +537,7 @@ class SettingsWindow:
             else:
                 # デフォルト設定を表示
                 self.folder_var.set(os.path.expanduser("~/Downloads"))
-                self.delay_var.set(3)
+                self.delay_var.set(2)
                 self.create_dirs_var.set(True)
                 self.update_rules_list()
         except Exception as e:
@@ -707,14 +548,16 @@ class SettingsWindow:
         # 既存のアイテムを削除
         for item in self.rules_tree.get_children():
             self.rules_tree.delete(item)
+        self.rule_items = {}
         
         # ルールを追加
         if self.mover and self.mover.config:
             for rule in self.mover.config.get('rules', []):
-                self.rules_tree.insert('', tk.END, text=rule.get('name', ''),
-                                     values=(rule.get('pattern', ''),
-                                           rule.get('destination', ''),
-                                           rule.get('action', '')))
+                item = self.rules_tree.insert('', tk.END, text=rule.get('name', ''),
+                                            values=(rule.get('pattern', ''),
+                                                  rule.get('destination', ''),
+                                                  rule.get('action', '')))
+                self.rule_items[item] = copy.deepcopy(dict(rule))
     
     def add_rule(self):
         """ルール追加"""
@@ -746,6 +589,7 @@ class SettingsWindow:
         
         if messagebox.askyesno("確認", "選択したルールを削除しますか？"):
             self.rules_tree.delete(selection[0])
+            self.rule_items.pop(selection[0], None)
     
     def add_rule_callback(self, rule_data, item_id=None):
         """ルール追加コールバック"""
@@ -768,33 +612,38 @@ class SettingsWindow:
     def save_settings(self):
         """設定保存"""
         try:
-            # 設定を構築
-            config = {
+            # 設定を構築（画面にない項目は現在の設定を引き継ぐ）
+            readiness_config = dict(self.mover.config.get('readiness', {}))
+            readiness_config['stable_seconds'] = self.delay_var.get()
+            config = dict(self.mover.config)
+            config.update({
                 'watch_folder': self.folder_var.get(),
-                'delay_seconds': self.delay_var.get(),
+                'readiness': readiness_config,
                 'create_directories': self.create_dirs_var.get(),
-                'log_level': 'INFO',
-                'safe_move': {
-                    'enabled': True,
-                    'hash_check_threshold': 104857600,
-                    'verify_integrity': True
-                }
-            }
+            })
+            config.setdefault('log_level', 'INFO')
+            config.setdefault('safe_move', {
+                'enabled': True,
+                'hash_check_threshold': 104857600,
+                'verify_integrity': True
+            })
             
             # ルールを追加
             rules = []
             for item in self.rules_tree.get_children():
                 item_data = self.rules_tree.item(item)
-                rules.append({
+                # サイズ・MIME などの条件は元のルールから引き継ぎ、画面で編集した項目だけ上書き
+                rule = dict(self.rule_items.get(item, {}))
+                rule.update({
                     'name': item_data['text'],
                     'pattern': item_data['values'][0],
                     'destination': item_data['values'][1],
                     'action': item_data['values'][2]
                 })
+                rules.append(rule)
             config['rules'] = rules
             
-            # 設定を保存
-            self.mover.config = config
+            # 設定を保存（監視を止めずに新しい設定へ切り替わる）
             self.mover.save_config(config)
             
             messagebox.showinfo("成功", "設定を保存しました")
@@ -1025,6 +874,12 @@ class StartupSettingsWindow:
 
 def main():
     """メイン関数"""
+    if '--headless' in sys.argv:
+        # GUIを読み込まずに監視のみ実行
+        from file_mover.service import main as service_main
+        sys.exit(service_main(sys.argv[1:]))
+    
+    _load_gui_modules()
     try:
         app = FileMoverGUI()
         app.run()
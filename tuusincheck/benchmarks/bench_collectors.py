@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Connection collector benchmark
+Compares the collection time of each backend in connection_collectors.py
+
+Fixture mode builds a fake /proc tree and the equivalent `netstat -ano`
+output for the same synthetic connections, so backends can be compared
+on any OS. --live additionally times every backend available on this
+machine against the real connection table (including process spawn for
+netstat).
+
+Usage:
+    python benchmarks/bench_collectors.py --processes 300 --connections 10
+    python benchmarks/bench_collectors.py --live --rounds 20
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from connection_collectors import (  # noqa: E402
+    COLLECTORS, NetstatCollector, ProcNetCollector, create_collector
+)
+
+PROC_HEADER = ("  sl  local_address rem_address   st tx_queue rx_queue tr tm->when "
+               "retrnsmt   uid  timeout inode\n")
+NETSTAT_HEADER = ("\nActive Connections\n\n"
+                  "  Proto  Local Address          Foreign Address        State           PID\n")
+
+
+def _hex_ipv4(octets):
+    return ''.join(f"{o:02X}" for o in reversed(octets))
+
+
+def build_fixture(root, processes, connections, rng):
+    """Write a fake /proc tree and matching netstat output; return the netstat text"""
+    os.makedirs(os.path.join(root, 'net'))
+    tcp_lines, udp_lines, netstat_lines = [PROC_HEADER], [PROC_HEADER], [NETSTAT_HEADER]
+    inode = 10000
+    for pid in range(1000, 1000 + processes):
+        fd_dir = os.path.join(root, str(pid), 'fd')
+        os.makedirs(fd_dir)
+        for fd in range(3):  # ソケット以外の fd
+            os.symlink(f"/dev/null{fd}", os.path.join(fd_dir, str(fd)))
+        for n in range(connections):
+            inode += 1
+            local = (192, 168, 1, 5)
+            remote = (rng.randrange(1, 224), rng.randrange(256), rng.randrange(256), rng.randrange(1, 255))
+            lport, rport = rng.randrange(49152, 65535), rng.choice((443, 80, 5228, 3478))
+            sl = len(tcp_lines) + len(udp_lines)
+            if n % 5 == 4:
+                udp_lines.append(
+                    f"{sl:4d}: {_hex_ipv4(local)}:{lport:04X} 00000000:0000 07 00000000:00000000 "
+                    f"00:00000000 00000000  1000        0 {inode} 2 0000000000000000 0\n")
+                netstat_lines.append(f"  UDP    {'.'.join(map(str, local))}:{lport}    *:*    {pid}\n")
+            else:
+                # 接続待ちのソケットも混ぜる（ESTABLISHED 以外は集計対象外）
+                state = '0A' if n % 7 == 6 else '01'
+                tcp_lines.append(
+                    f"{sl:4d}: {_hex_ipv4(local)}:{lport:04X} {_hex_ipv4(remote)}:{rport:04X} {state} "
+                    f"00000000:00000000 00:00000000 00000000  1000        0 {inode} 1 0000000000000000 20 4 30 10 -1\n")
+                netstat_lines.append(
+                    f"  TCP    {'.'.join(map(str, local))}:{lport}    {'.'.join(map(str, remote))}:{rport}    "
+                    f"{'ESTABLISHED' if state == '01' else 'LISTENING'}    {pid}\n")
+            os.symlink(f"socket:[{inode}]", os.path.join(fd_dir, str(3 + n)))
+
+    for name, lines in (('tcp', tcp_lines), ('udp', udp_lines), ('tcp6', [PROC_HEADER]), ('udp6', [PROC_HEADER])):
+        with open(os.path.join(root, 'net', name), 'w') as f:
+            f.writelines(lines)
+    return ''.join(netstat_lines)
+
+
+def time_collector(collector, rounds):
+    """Collect `rounds` times; return timings (ms) and the connection count"""
+    timings, count = [], 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        table = collector.collect()
+        timings.append((time.perf_counter() - start) * 1000)
+        count = sum(len(data['connections']) for data in table.values())
+    return timings, count
+
+
+def summarize(name, timings, count):
+    return {
+        'backend': name,
+        'connections': count,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Connection collector benchmark')
+    parser.add_argument('--processes', type=int, default=300, help='Processes in the fixture')
+    parser.add_argument('--connections', type=int, default=10, help='Sockets per process in the fixture')
+    parser.add_argument('--rounds', type=int, default=10, help='Samples per backend')
+    parser.add_argument('--live', action='store_true', help='Also time the backends on this machine')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_collectors_') as root:
+        netstat_text = build_fixture(root, args.processes, args.connections, random.Random(args.seed))
+        for name, collector in (('fixture:proc', ProcNetCollector(proc_root=root)),
+                                ('fixture:netstat-parse', NetstatCollector(runner=lambda: netstat_text))):
+            results.append(summarize(name, *time_collector(collector, args.rounds)))
+
+    if args.live:
+        for name in COLLECTORS:
+            collector = create_collector(name)
+            if not collector.available():
+                print(f"live:{name}: not available on this machine")
+                continue
+            try:
+                results.append(summarize(f"live:{name}", *time_collector(collector, args.rounds)))
+            except Exception as e:
+                print(f"live:{name}: {e}")
+
+    print(f"{'backend':<24} {'conns':>7} {'min ms':>10} {'median ms':>10} {'max ms':>10}")
+    for r in results:
+        print(f"{r['backend']:<24} {r['connections']:>7} {r['min_ms']:>10.3f} "
+              f"{r['median_ms']:>10.3f} {r['max_ms']:>10.3f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Connection table collectors for NetworkMonitorV2
+Pluggable backends that return the current connections grouped by PID
+
+- proc:    read /proc/net/{tcp,tcp6,udp,udp6} directly (Linux)
+- psutil:  one psutil.net_connections(kind='inet') call
+- netstat: parse `netstat -ano` output (fallback, Windows format)
+- auto:    first backend that works on this machine, in the order above
+"""
+
+import os
+import socket
+import subprocess
+import sys
+from collections import defaultdict
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# /proc/net/tcp の状態コード（01 = ESTABLISHED、UDP では connect() 済み）
+TCP_ESTABLISHED = '01'
+
+# 見つからなかった inode を覚えておく refresh の回数
+UNRESOLVED_KEEP = 10
+
+PROC_NET_FILES = (
+    ('tcp', 'TCP', socket.AF_INET),
+    ('tcp6', 'TCP', socket.AF_INET6),
+    ('udp', 'UDP', socket.AF_INET),
+    ('udp6', 'UDP', socket.AF_INET6),
+)
+
+
+def new_connection_table():
+    """PID -> {'sent', 'recv', 'connections'} (same shape the monitor has always used)"""
+    return defaultdict(lambda: {'sent': 0, 'recv': 0, 'connections': []})
+
+
+def decode_proc_address(value, family):
+    """Decode a /proc/net address such as '0100007F:0277' to '127.0.0.1:631'"""
+    host, port = value.split(':')
+    raw = bytes.fromhex(host)
+    # 32ビット単位のリトルエンディアンで格納されている
+    raw = b''.join(raw[i:i + 4][::-1] for i in range(0, len(raw), 4))
+    address = socket.inet_ntop(family, raw)
+    if family == socket.AF_INET6:
+        address = f"[{address}]"
+    return f"{address}:{int(port, 16)}"
+
+
+def parse_netstat(text):
+    """Parse Windows `netstat -ano` output into a connection table
+
+    Only lines starting with TCP/UDP are read, so the header and the
+    localized title lines are skipped whatever their count.
+    """
+    table = new_connection_table()
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        proto = parts[0].upper()
+        try:
+            if proto == 'TCP' and len(parts) >= 5:
+                if parts[3] == 'ESTABLISHED':
+                    table[int(parts[-1])]['connections'].append({
+                        'proto': parts[0],
+                        'local': parts[1],
+                        'foreign': parts[2],
+                        'state': parts[3]
+                    })
+            elif proto == 'UDP' and len(parts) >= 4:
+                table[int(parts[-1])]['connections'].append({
+                    'proto': parts[0],
+                    'local': parts[1],
+                    'foreign': '*:*',
+                    'state': 'LISTENING'
+                })
+        except ValueError:
+            continue
+    return table
+
+
+class SocketOwnerMap:
+    """Socket inode -> PID map refreshed only for processes whose fd table changed
+
+    A process's fds are re-read when it is new or the (mtime, size) of
+    /proc/<pid>/fd changed; kernels since 6.2 report the number of open
+    fds as its size, older ones always report 0. A newly wanted inode
+    that is still unknown re-reads every process whose key did not change
+    (an fd swapped for another, or a kernel without fd counts). Inodes
+    that stay unknown afterwards (other users' processes) cause no
+    further rescan until they expire after UNRESOLVED_KEEP refreshes.
+    """
+
+    def __init__(self, proc_root='/proc'):
+        self.proc_root = proc_root
+        # pid -> ((mtime_ns, size), socket inodes)
+        self._pids = {}
+        self._owners = {}
+        # 見つからなかった inode -> 見つからないと判断した refresh の回数
+        self._unresolved = {}
+        self._refreshes = 0
+
+    def _scan_pid(self, pid, key):
+        """Re-read the socket fds of one process"""
+        fd_dir = os.path.join(self.proc_root, str(pid), 'fd')
+        inodes = []
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            fds = []  # 終了済み・権限なし
+        for fd in fds:
+            try:
+                target = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:
+                continue
+            if target.startswith('socket:['):
+                inodes.append(int(target[8:-1]))
+        self._forget(pid)
+        self._pids[pid] = (key, inodes)
+        for inode in inodes:
+            self._owners[inode] = pid
+
+    def _forget(self, pid):
+        entry = self._pids.pop(pid, None)
+        if entry is not None:
+            for inode in entry[1]:
+                if self._owners.get(inode) == pid:
+                    del self._owners[inode]
+
+    def refresh(self, wanted=()):
+        """Update the map and return it ({inode: pid})"""
+        self._refreshes += 1
+        live = {}
+        try:
+            with os.scandir(self.proc_root) as entries:
+                for entry in entries:
+                    if not entry.name.isdigit():
+                        continue
+                    try:
+                        st = os.stat(os.path.join(entry.path, 'fd'))
+                        live[int(entry.name)] = (st.st_mtime_ns, st.st_size)
+                    except OSError:
+                        live[int(entry.name)] = None
+        except OSError:
+            return self._owners
+
+        for pid in [pid for pid in self._pids if pid not in live]:
+            self._forget(pid)
+        unchanged = []
+        for pid, key in live.items():
+            cached = self._pids.get(pid)
+            if cached is None or cached[0] != key:
+                self._scan_pid(pid, key)
+            else:
+                unchanged.append(pid)
+
+        # 期限切れの inode は忘れ、次に問い合わせがあれば改めて探す
+        self._unresolved = {inode: since for inode, since in self._unresolved.items()
+                            if inode not in self._owners and self._refreshes - since < UNRESOLVED_KEEP}
+        missing = [inode for inode in wanted
+                   if inode not in self._owners and inode not in self._unresolved]
+        if missing:
+            # fd の入れ替えや fd 数を返さないカーネルで取りこぼした分（キーが変わっていないプロセスを読み直す）
+            for pid in unchanged:
+                self._scan_pid(pid, live[pid])
+            # それでも見つからない inode は期限まで読み直しのきっかけにしない
+            for inode in missing:
+                if inode not in self._owners:
+                    self._unresolved[inode] = self._refreshes
+        return self._owners
+
+
+class ConnectionCollector:
+    """Base class: collect() returns a connection table, raising on failure"""
+
+    name = 'base'
+    # inode -> PID の対応表（/proc を読むバックエンドのみ、他の処理と共有できる）
+    owner_map = None
+
+    def available(self):
+        """Whether the backend can run on this machine"""
+        return True
+
+    def collect(self):
+        raise NotImplementedError
+
+
+class ProcNetCollector(ConnectionCollector):
+    """Read the kernel connection tables from /proc/net (Linux)"""
+
+    name = 'proc'
+
+    def __init__(self, proc_root='/proc'):
+        self.proc_root = proc_root
+        self.owner_map = SocketOwnerMap(proc_root)
+
+    def available(self):
+        return os.path.exists(os.path.join(self.proc_root, 'net', 'tcp'))
+
+    def read_sockets(self):
+        """Sockets to report: {inode: connection dict}"""
+        sockets = {}
+        for file_name, proto, family in PROC_NET_FILES:
+            path = os.path.join(self.proc_root, 'net', file_name)
+            try:
+                with open(path, 'r') as f:
+                    next(f, None)  # ヘッダー行
+                    lines = f.readlines()
+            except FileNotFoundError:
+                continue  # IPv6 無効の環境など
+
+            for line in lines:
+                parts = line.split()
+                if len(parts) < 10:
+                    continue
+                # UDP でも connect() 済みなら相手のアドレスを持つ（QUIC など）
+                connected = parts[3] == TCP_ESTABLISHED
+                if proto == 'TCP' and not connected:
+                    continue
+                inode = int(parts[9])
+                if inode == 0:
+                    continue
+                try:
+                    local = decode_proc_address(parts[1], family)
+                    foreign = decode_proc_address(parts[2], family) if connected else '*:*'
+                except ValueError:
+                    continue
+                sockets[inode] = {
+                    'proto': proto,
+                    'local': local,
+                    'foreign': foreign,
+                    'state': 'ESTABLISHED' if connected else 'LISTENING',
+                    'inode': inode
+                }
+        return sockets
+
+    def socket_owners(self, wanted=()):
+        """Map socket inode -> PID (incremental, see SocketOwnerMap)"""
+        return self.owner_map.refresh(wanted)
+
+    def collect(self):
+        table = new_connection_table()
+        sockets = self.read_sockets()
+        if not sockets:
+            return table
+        owners = self.socket_owners(sockets)
+        for inode, conn in sockets.items():
+            pid = owners.get(inode)
+            if pid is not None:
+                table[pid]['connections'].append(conn)
+        return table
+
+
+class PsutilCollector(ConnectionCollector):
+    """One psutil.net_connections(kind='inet') call"""
+
+    name = 'psutil'
+
+    def available(self):
+        return psutil is not None
+
+    def collect(self):
+        table = new_connection_table()
+        for conn in psutil.net_connections(kind='inet'):
+            if conn.pid is None:
+                continue  # 権限がなく所有プロセスが分からない
+            local = self._format(conn.laddr, conn.family)
+            if conn.type == socket.SOCK_STREAM:
+                if conn.status != psutil.CONN_ESTABLISHED:
+                    continue
+                entry = {'proto': 'TCP', 'local': local,
+                         'foreign': self._format(conn.raddr, conn.family), 'state': 'ESTABLISHED'}
+            elif conn.raddr:
+                entry = {'proto': 'UDP', 'local': local,
+                         'foreign': self._format(conn.raddr, conn.family), 'state': 'ESTABLISHED'}
+            else:
+                entry = {'proto': 'UDP', 'local': local, 'foreign': '*:*', 'state': 'LISTENING'}
+            table[conn.pid]['connections'].append(entry)
+        return table
+
+    @staticmethod
+    def _format(addr, family):
+        if not addr:
+            return '*:*'
+        if family == socket.AF_INET6:
+            return f"[{addr.ip}]:{addr.port}"
+        return f"{addr.ip}:{addr.port}"
+
+
+class NetstatCollector(ConnectionCollector):
+    """Spawn `netstat -ano` once per sample and parse its output"""
+
+    name = 'netstat'
+
+    def __init__(self, runner=None):
+        # runner: 出力テキストを返す関数（ベンチマークでは固定の出力を渡す）
+        self.runner = runner or self._run_netstat
+
+    def available(self):
+        return self.runner is not self._run_netstat or sys.platform == 'win32'
+
+    @staticmethod
+    def _run_netstat():
+        kwargs = {}
+        if sys.platform == 'win32':
+            # コンソールウィンドウを表示しない
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startupinfo.wShowWindow = 0  # SW_HIDE
+            kwargs = {'startupinfo': startupinfo, 'creationflags': subprocess.CREATE_NO_WINDOW}
+        result = subprocess.run(['netstat', '-ano'], capture_output=True, text=True,
+                                timeout=10, **kwargs)
+        return result.stdout
+
+    def collect(self):
+        return parse_netstat(self.runner())
+
+
+class AutoCollector(ConnectionCollector):
+    """Use the first backend that works; a backend that fails is dropped for good"""
+
+    name = 'auto'
+
+    def __init__(self, candidates):
+        self.candidates = [c for c in candidates if c.available()]
+        self.active = None
+
+    @property
+    def owner_map(self):
+        """Owner map of the first candidate that keeps one (None if no candidate does)"""
+        return next((c.owner_map for c in self.candidates if c.owner_map is not None), None)
+
+    def collect(self):
+        while self.candidates:
+            collector = self.candidates[0]
+            try:
+                table = collector.collect()
+            except Exception as e:
+                print(f"Connection collector '{collector.name}' failed, falling back: {e}")
+                self.candidates.pop(0)
+                continue
+            if self.active is not collector:
+                self.active = collector
+                print(f"Connection collector: {collector.name}")
+            return table
+        raise RuntimeError("No connection collector available")
+
+
+COLLECTORS = {
+    'proc': ProcNetCollector,
+    'psutil': PsutilCollector,
+    'netstat': NetstatCollector,
+}
+
+
+def create_collector(backend='auto'):
+    """Create a collector by name ('auto', 'proc', 'psutil' or 'netstat')"""
+    if backend == 'auto':
+        return AutoCollector([cls() for cls in COLLECTORS.values()])
+    try:
+        return COLLECTORS[backend]()
+    except KeyError:
+        raise ValueError(f"Unknown connection collector: {backend}") from None
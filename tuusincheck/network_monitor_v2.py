@@ -22,6 +22,11 @@ import subprocess
 if not hasattr(subprocess, 'CREATE_NO_WINDOW'):
     subprocess.CREATE_NO_WINDOW = 0x08000000
 
+from connection_collectors import create_collector, new_connection_table
+from process_accounting import create_accounting_engine
+from process_cache import ProcessMetadataCache
+from usage_store import UsageStore, DEFAULT_STORE_FILE, parse_retention
+
 # システムトレイ用ライブラリ
 try:
     from PIL import Image, ImageDraw
@@ -33,7 +38,8 @@ except ImportError:
     print("インストール: pip install pystray Pillow")
 
 class NetworkMonitorV2:
-    def __init__(self, update_interval=180):
+    def __init__(self, update_interval=180, collector='auto', accounting='auto', store_file=DEFAULT_STORE_FILE,
+                 retention=None):
         self.monitoring = False
         self.process_data = defaultdict(lambda: {'bytes_sent': 0, 'bytes_recv': 0, 'last_update': None})
         self.previous_connections = {}
@@ -41,6 +47,19 @@ class NetworkMonitorV2:
         self.monitor_thread = None
         self.update_interval = update_interval  # Monitoring interval (seconds)
         self.last_measurement_time = None
+        # Connection table backend (see connection_collectors.py)
+        self.collector = create_collector(collector)
+        # Per-process byte source (see process_accounting.py)
+        self.accounting = create_accounting_engine(accounting, owner_map=self.collector.owner_map)
+        # Process name/exe/cmdline keyed by (pid, create_time)
+        self.process_cache = ProcessMetadataCache()
+        # Per-interval history with rollups (None = not persisted)
+        self.store = None
+        if store_file:
+            try:
+                self.store = UsageStore(store_file, retention=retention)
+            except Exception as e:
+                print(f"Usage store error: {e}")
     
     def set_update_interval(self, interval):
         """Set monitoring interval in seconds"""
@@ -48,118 +67,39 @@ class NetworkMonitorV2:
         print(f"Monitoring interval set to {interval} seconds")
         
     def get_network_connections_with_stats(self):
-        """Get network connections with statistics using netstat"""
-        connections_by_pid = defaultdict(lambda: {'sent': 0, 'recv': 0, 'connections': []})
-        
+        """Get network connections grouped by PID from the connection collector"""
         try:
-            # Use netstat to get connection statistics
-            # This is more reliable on Windows
-            # CREATE_NO_WINDOW flag to prevent console window from appearing
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = 0  # SW_HIDE
-            
-            result = subprocess.run(
-                ['netstat', '-ano', '-p', 'TCP'],
-                capture_output=True,
-                text=True,
-                timeout=10,
-                startupinfo=startupinfo,
-                creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0
-            )
-            
-            lines = result.stdout.strip().split('\n')
-            
-            for line in lines[4:]:  # Skip header lines
-                parts = line.split()
-                if len(parts) >= 5:
-                    try:
-                        pid = int(parts[-1])
-                        proto = parts[0]
-                        local_addr = parts[1]
-                        foreign_addr = parts[2]
-                        state = parts[3] if len(parts) > 3 else ''
-                        
-                        if state == 'ESTABLISHED':
-                            connections_by_pid[pid]['connections'].append({
-                                'proto': proto,
-                                'local': local_addr,
-                                'foreign': foreign_addr,
-                                'state': state
-                            })
-                    except (ValueError, IndexError):
-                        continue
-            
-            # Also get UDP connections
-            result_udp = subprocess.run(
-                ['netstat', '-ano', '-p', 'UDP'],
-                capture_output=True,
-                text=True,
-                timeout=10,
-                startupinfo=startupinfo,
-                creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0
-            )
-            
-            lines_udp = result_udp.stdout.strip().split('\n')
-            
-            for line in lines_udp[4:]:  # Skip header lines
-                parts = line.split()
-                if len(parts) >= 4:
-                    try:
-                        pid = int(parts[-1])
-                        proto = parts[0]
-                        local_addr = parts[1]
-                        
-                        connections_by_pid[pid]['connections'].append({
-                            'proto': proto,
-                            'local': local_addr,
-                            'foreign': '*:*',
-                            'state': 'LISTENING'
-                        })
-                    except (ValueError, IndexError):
-                        continue
-                        
+            return self.collector.collect()
         except Exception as e:
-            print(f"Netstat error: {e}")
-        
-        return connections_by_pid
+            print(f"Connection collection error: {e}")
+            return new_connection_table()
     
-    def estimate_bandwidth_by_connections(self, total_sent, total_recv, connections_by_pid):
-        """Estimate bandwidth per process based on connection count (approximation)"""
+    def account_bandwidth(self, total_sent, total_recv, connections_by_pid):
+        """Bytes per process for the interval from the accounting engine"""
         process_stats = {}
+        per_pid = self.accounting.sample(connections_by_pid, total_sent, total_recv)
         
-        # Get total connection count
-        total_connections = sum(len(data['connections']) for data in connections_by_pid.values())
-        
-        if total_connections == 0:
-            return process_stats
-        
-        # Distribute bandwidth proportionally to connection count
-        # This is an approximation, not exact measurement
-        for pid, conn_data in connections_by_pid.items():
-            if len(conn_data['connections']) > 0:
-                try:
-                    proc = psutil.Process(pid)
-                    name = proc.name()
-                    
-                    # Weight by connection count
-                    weight = len(conn_data['connections']) / total_connections
-                    
-                    estimated_sent = int(total_sent * weight)
-                    estimated_recv = int(total_recv * weight)
-                    
-                    process_stats[pid] = {
-                        'name': name,
-                        'bytes_sent': estimated_sent,
-                        'bytes_recv': estimated_recv,
-                        'total_bytes': estimated_sent + estimated_recv,
-                        'connection_count': len(conn_data['connections']),
-                        'connections': conn_data['connections'][:5],  # First 5 connections
-                        'timestamp': datetime.now()
-                    }
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
+        pids = set(per_pid) | {pid for pid, data in connections_by_pid.items() if data['connections']}
+        for pid in pids:
+            info = self.process_cache.get(pid)
+            if info is None:
+                continue
+            
+            sent, recv = per_pid.get(pid, (0, 0))
+            connections = connections_by_pid[pid]['connections'] if pid in connections_by_pid else []
+            process_stats[pid] = {
+                'name': info.name,
+                'exe': info.exe,
+                'bytes_sent': sent,
+                'bytes_recv': recv,
+                'total_bytes': sent + recv,
+                'connection_count': len(connections),
+                'connections': connections[:5],  # First 5 connections
+                'timestamp': datetime.now()
+            }
         
+        # Keep metadata of processes that are still displayed
+        self.process_cache.prune(pids | set(self.process_data))
         return process_stats
     
     def format_bytes(self, bytes_value):
@@ -189,12 +129,26 @@ class NetworkMonitorV2:
         self.monitoring = False
         if self.monitor_thread:
             self.monitor_thread.join(timeout=5)
+        if self.store:
+            self.store.flush()
         print("Network monitoring stopped")
     
+    @staticmethod
+    def get_interface_counters():
+        """Byte counters per network interface, excluding loopback: {nic: (sent, recv)}"""
+        counters = {}
+        for nic, io in psutil.net_io_counters(pernic=True).items():
+            # Skip loopback (lo / lo0 / Loopback Pseudo-Interface)
+            if nic in ('lo', 'lo0') or 'loopback' in nic.lower():
+                continue
+            counters[nic] = (io.bytes_sent, io.bytes_recv)
+        return counters
+    
     def _monitor_loop(self):
         """Monitoring loop"""
         # Get initial network I/O
-        prev_net_io = psutil.net_io_counters()
+        prev_net_io = self.get_interface_counters()
+        self.accounting.prime()
         
         while self.monitoring:
             try:
@@ -202,17 +156,20 @@ class NetworkMonitorV2:
                 time.sleep(self.update_interval)
                 
                 # Get current network I/O
-                current_net_io = psutil.net_io_counters()
+                current_net_io = self.get_interface_counters()
                 
-                # Calculate difference
-                bytes_sent = current_net_io.bytes_sent - prev_net_io.bytes_sent
-                bytes_recv = current_net_io.bytes_recv - prev_net_io.bytes_recv
+                # Calculate difference (interfaces present in both samples)
+                bytes_sent = bytes_recv = 0
+                for nic, (sent, recv) in current_net_io.items():
+                    if nic in prev_net_io:
+                        bytes_sent += max(0, sent - prev_net_io[nic][0])
+                        bytes_recv += max(0, recv - prev_net_io[nic][1])
                 
                 # Get connections
                 connections_by_pid = self.get_network_connections_with_stats()
                 
-                # Estimate bandwidth per process
-                process_stats = self.estimate_bandwidth_by_connections(bytes_sent, bytes_recv, connections_by_pid)
+                # Bytes per process
+                process_stats = self.account_bandwidth(bytes_sent, bytes_recv, connections_by_pid)
                 
                 # Update cumulative data
                 for pid, stats in process_stats.items():
@@ -222,6 +179,10 @@ class NetworkMonitorV2:
                     self.process_data[pid]['name'] = stats['name']
                     self.process_data[pid]['last_connections'] = stats.get('connection_count', 0)
                 
+                # Append the interval to the history
+                if self.store:
+                    self.store.append(time.time(), process_stats)
+                
                 # Display results
                 self._display_results(bytes_sent, bytes_recv, process_stats)
                 
@@ -241,7 +202,7 @@ class NetworkMonitorV2:
         print(f"Network Usage Report - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*80}")
         print(f"Total Traffic (last 3 min): Sent: {self.format_bytes(total_sent)} | Recv: {self.format_bytes(total_recv)}")
-        print(f"\nEstimated Per-Process Usage (based on connection count):")
+        print(f"\nPer-Process Usage ({self.accounting.source.description}):")
         print(f"{'-'*80}")
         
         if process_stats:
@@ -256,6 +217,12 @@ class NetworkMonitorV2:
                       f"Connections: {data['connection_count']:>3}")
         else:
             print("No active network connections detected")
+        
+        unknown_sent, unknown_recv = self.accounting.unattributed
+        if unknown_sent or unknown_recv:
+            # e.g. TCP connections that opened and closed within the interval
+            print(f"\nUnattributed: Sent: {self.format_bytes(unknown_sent)} | "
+                  f"Recv: {self.format_bytes(unknown_recv)}")
     
     def get_current_data(self):
         """Get current monitoring data"""
@@ -290,8 +257,10 @@ class NetworkMonitorV2:
             return False
 
 class NetworkMonitorGUI:
-    def __init__(self, silent_mode=False):
-        self.monitor = NetworkMonitorV2()
+    def __init__(self, silent_mode=False, collector='auto', accounting='auto', store_file=DEFAULT_STORE_FILE,
+                 retention=None):
+        self.monitor = NetworkMonitorV2(collector=collector, accounting=accounting, store_file=store_file,
+                                        retention=retention)
         self.root = tk.Tk()
         self.root.title("Tethering Network Monitor V2")
         self.root.geometry("1200x750")
@@ -357,7 +326,7 @@ class NetworkMonitorGUI:
         
         # Info label
         self.info_label = ttk.Label(main_frame, 
-                              text="Monitors network usage per application at selected intervals (estimated based on connection count)",
+                              text=f"Monitors network usage per application at selected intervals ({self.monitor.accounting.source.description})",
                               font=("Arial", 9), foreground="blue")
         self.info_label.grid(row=1, column=0, columnspan=4, pady=(0, 10))
         
@@ -463,7 +432,7 @@ class NetworkMonitorGUI:
         
         # Note label
         note_label = ttk.Label(main_frame, 
-                              text="Note: Per-app usage is estimated based on connection count. For exact measurements, use tools like GlassWire or Wireshark.",
+                              text=f"Note: Per-app usage is {self.monitor.accounting.source.description}. For packet-level measurements, use tools like GlassWire or Wireshark.",
                               font=("Arial", 8), foreground="gray")
         note_label.grid(row=6, column=0, columnspan=4, pady=(5, 0))
         
@@ -627,7 +596,7 @@ class NetworkMonitorGUI:
         }.get(interval, f"{interval} seconds")
         
         self.info_label.config(
-            text=f"Monitors network usage per application every {interval_text} (estimated based on connection count)"
+            text=f"Monitors network usage per application every {interval_text} ({self.monitor.accounting.source.description})"
         )
         
     def start_monitoring(self):
@@ -664,7 +633,7 @@ class NetworkMonitorGUI:
                 messagebox.showinfo("Started", 
                                   f"Network monitoring started.\n\n"
                                   f"Monitoring interval: {interval_text}\n"
-                                  f"Per-app usage is estimated based on connection count.\n"
+                                  f"Per-app usage: {self.monitor.accounting.source.description}.\n"
                                   f"First measurement will appear in {interval_text}.")
         except Exception as e:
             messagebox.showerror("Error", f"Start monitoring error: {e}")
@@ -741,12 +710,9 @@ class NetworkMonitorGUI:
                 total_bytes = proc_data['bytes_sent'] + proc_data['bytes_recv']
                 
                 if total_bytes > 0:
-                    # Get process name
-                    try:
-                        proc = psutil.Process(int(pid))
-                        name = proc.name()
-                    except:
-                        name = proc_data.get('name', 'Unknown')
+                    # Process name from the monitor's cache (no per-row process lookup)
+                    info = self.monitor.process_cache.cached(pid)
+                    name = info.name if info else proc_data.get('name', 'Unknown')
                     
                     last_update = proc_data['last_update'].strftime('%H:%M:%S') if proc_data['last_update'] else 'Never'
                     
@@ -806,11 +772,23 @@ def main():
                        help='Start in silent mode (no popup messages)')
     parser.add_argument('--minimized', action='store_true',
                        help='Start minimized to taskbar')
+    parser.add_argument('--collector', default='auto',
+                       choices=['auto', 'proc', 'psutil', 'netstat'],
+                       help='Connection table backend (default: auto)')
+    parser.add_argument('--accounting', default='auto',
+                       choices=['auto', 'sockdiag', 'procio', 'connections'],
+                       help='Per-process byte source (default: auto)')
+    parser.add_argument('--store', default=DEFAULT_STORE_FILE,
+                       help='Usage history file (SQLite)')
+    parser.add_argument('--no-store', action='store_true',
+                       help='Do not record usage history')
+    parser.add_argument('--retention', type=parse_retention, default=None,
+                       help='History retention, e.g. "raw=48h,minute=14d,hour=180d,day=forever"')
     args = parser.parse_args()
     
     print("Starting Tethering Network Monitor App V2...")
     print("This app monitors network usage per application")
-    print("Per-app usage is ESTIMATED based on connection count.")
+    print("Per-app usage is measured per socket where the OS allows it (see --accounting).")
     
     if args.silent:
         print("Silent mode: Popup messages disabled")
@@ -828,7 +806,9 @@ def main():
         pass
     
     # Start GUI app
-    app = NetworkMonitorGUI(silent_mode=args.silent)
+    app = NetworkMonitorGUI(silent_mode=args.silent, collector=args.collector, accounting=args.accounting,
+                             store_file=None if args.no_store else args.store,
+                             retention=args.retention)
     
     # Start minimized if requested
     if args.minimized:
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-process byte accounting for NetworkMonitorV2
+Pluggable sources that turn one sampling interval into bytes per PID
+
+- sockdiag:    TCP byte counters per socket (tcp_info via netlink
+               sock_diag, Linux). Deltas are tracked per socket inode and
+               mapped to PIDs through /proc/<pid>/fd. The rest of the
+               interface total (UDP, and TCP sockets that opened and closed
+               between two samples) is shared among processes with connected
+               UDP flows, or left unattributed when there are none.
+- procio:      share of the interface total weighted by each process's
+               /proc/<pid>/io read/write activity (Linux)
+- connections: share of the interface total by connection count
+               (the original estimate; works everywhere)
+"""
+
+import os
+import socket
+import struct
+import sys
+
+from connection_collectors import SocketOwnerMap
+
+# netlink / sock_diag の定数（linux/sock_diag.h, linux/inet_diag.h）
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+INET_DIAG_INFO = 2
+
+NLMSG_HEADER = struct.Struct('=IHHII')
+# inet_diag_req_v2: family, protocol, ext, pad, states, inet_diag_sockid (48 bytes)
+INET_DIAG_REQ = struct.Struct('=BBBxI48x')
+# inet_diag_msg: family, state, timer, retrans, sport, dport, src(16), dst(16), if, cookie(8),
+#                expires, rqueue, wqueue, uid, inode
+INET_DIAG_MSG = struct.Struct('=BBBB2s2s16s16sI8sIIIII')
+RTATTR = struct.Struct('=HH')
+# struct tcp_info の tcpi_bytes_acked / tcpi_bytes_received（Linux 4.1 以降）
+TCP_INFO_BYTES = struct.Struct('=QQ')
+TCP_INFO_BYTES_OFFSET = 120
+
+# LISTEN と TIME_WAIT 以外の全状態（転送量を持つソケット）
+TCP_STATES = 0xffffffff & ~(1 << 10) & ~(1 << 6)
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _is_loopback(family, address):
+    if family == socket.AF_INET:
+        return address[0] == 127
+    # ::1 と IPv4 射影アドレスの 127.x
+    return address == b'\0' * 15 + b'\1' or (address[:12] == b'\0' * 10 + b'\xff\xff' and address[12] == 127)
+
+
+def share_by_connections(total_sent, total_recv, connections_by_pid, proto=None):
+    """Split a byte total across PIDs in proportion to their (proto) connection count"""
+    counts = {}
+    for pid, data in connections_by_pid.items():
+        n = sum(1 for conn in data['connections'] if proto is None or conn['proto'] == proto)
+        if n:
+            counts[pid] = n
+    total_connections = sum(counts.values())
+    if total_connections == 0:
+        return {}
+    return {pid: [int(total_sent * n / total_connections), int(total_recv * n / total_connections)]
+            for pid, n in counts.items()}
+
+
+class AccountingSource:
+    """Base class: sample() returns {pid: [bytes_sent, bytes_recv]} for the interval"""
+
+    name = 'base'
+    description = ''
+    # 直近の sample() でどのプロセスにも配分しなかったバイト数 [sent, recv]
+    unattributed = (0, 0)
+
+    def available(self):
+        """Whether the source can run on this machine"""
+        return True
+
+    def prime(self):
+        """Take the baseline counters at the start of monitoring"""
+
+    def sample(self, connections_by_pid, total_sent, total_recv):
+        """total_sent / total_recv: bytes of the interval on non-loopback interfaces"""
+        raise NotImplementedError
+
+
+class ConnectionShareSource(AccountingSource):
+    """Share the interface total by connection count"""
+
+    name = 'connections'
+    description = 'estimated based on connection count'
+
+    def sample(self, connections_by_pid, total_sent, total_recv):
+        return share_by_connections(total_sent, total_recv, connections_by_pid)
+
+
+class SockDiagSource(AccountingSource):
+    """Exact TCP bytes per socket from netlink sock_diag"""
+
+    name = 'sockdiag'
+    description = 'TCP bytes per socket, UDP flows estimated'
+
+    def __init__(self, proc_root='/proc', owner_map=None):
+        # inode -> (bytes_acked, bytes_received)
+        self._previous = {}
+        # 接続一覧の収集側と同じ対応表を使い、/proc/<pid>/fd の走査を二重にしない
+        self._owners = owner_map if owner_map is not None else SocketOwnerMap(proc_root)
+
+    def available(self):
+        if not sys.platform.startswith('linux'):
+            return False
+        try:
+            self.read_counters()
+        except OSError:
+            return False
+        return True
+
+    def _dump(self, sock, family, seq):
+        """Yield (inode, bytes_acked, bytes_received) for one address family"""
+        request = INET_DIAG_REQ.pack(family, socket.IPPROTO_TCP, 1 << (INET_DIAG_INFO - 1), TCP_STATES)
+        sock.sendall(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(request), SOCK_DIAG_BY_FAMILY,
+                                       NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + request)
+        while True:
+            data = sock.recv(1 << 20)
+            offset = 0
+            while offset + NLMSG_HEADER.size <= len(data):
+                length, msg_type = NLMSG_HEADER.unpack_from(data, offset)[:2]
+                if msg_type == NLMSG_DONE:
+                    return
+                if msg_type == NLMSG_ERROR:
+                    error = struct.unpack_from('=i', data, offset + NLMSG_HEADER.size)[0]
+                    raise OSError(-error, os.strerror(-error))
+                msg = offset + NLMSG_HEADER.size
+                fields = INET_DIAG_MSG.unpack_from(data, msg)
+                inode = fields[-1]
+                if inode and not _is_loopback(family, fields[6]):
+                    attr = msg + INET_DIAG_MSG.size
+                    end = offset + length
+                    while attr + RTATTR.size <= end:
+                        attr_len, attr_type = RTATTR.unpack_from(data, attr)
+                        if attr_len < RTATTR.size:
+                            break
+                        if (attr_type == INET_DIAG_INFO and
+                                attr_len >= RTATTR.size + TCP_INFO_BYTES_OFFSET + TCP_INFO_BYTES.size):
+                            acked, received = TCP_INFO_BYTES.unpack_from(
+                                data, attr + RTATTR.size + TCP_INFO_BYTES_OFFSET)
+                            yield inode, acked, received
+                            break
+                        attr += _align(attr_len)
+                offset += _align(length)
+
+    def read_counters(self):
+        """Current cumulative counters of every non-loopback TCP socket: {inode: (sent, recv)}"""
+        counters = {}
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG) as sock:
+            for seq, family in enumerate((socket.AF_INET, socket.AF_INET6), 1):
+                for inode, acked, received in self._dump(sock, family, seq):
+                    counters[inode] = (acked, received)
+        return counters
+
+    def prime(self):
+        self._previous = self.read_counters()
+
+    def sample(self, connections_by_pid, total_sent, total_recv):
+        counters = self.read_counters()
+        previous, self._previous = self._previous, counters
+
+        # 前回からの差分（前回なかったソケットは今回の間に作られたものとして全量）
+        deltas = {}
+        for inode, (sent, recv) in counters.items():
+            prev_sent, prev_recv = previous.get(inode, (0, 0))
+            if sent < prev_sent or recv < prev_recv:
+                prev_sent = prev_recv = 0  # inode の再利用
+            if sent != prev_sent or recv != prev_recv:
+                deltas[inode] = (sent - prev_sent, recv - prev_recv)
+
+        owners = {conn['inode']: pid for pid, data in connections_by_pid.items()
+                  for conn in data['connections'] if 'inode' in conn}
+        unmapped = [inode for inode in deltas if inode not in owners]
+        if unmapped:
+            # 接続一覧に含まれない状態のソケット（CLOSE_WAIT など）
+            owners.update(self._owners.refresh(unmapped))
+
+        result = {}
+        tcp_sent = tcp_recv = 0
+        for inode, (sent, recv) in deltas.items():
+            # 所有プロセスが分からない TCP（他ユーザーのソケットなど）も全体からは差し引く
+            tcp_sent += sent
+            tcp_recv += recv
+            pid = owners.get(inode)
+            if pid is None:
+                continue
+            stats = result.setdefault(pid, [0, 0])
+            stats[0] += sent
+            stats[1] += recv
+
+        # TCP で説明できない分（total_sent / total_recv はループバックを除いたインターフェースの合計）には
+        # UDP のほか、間隔内に開いて閉じた TCP ソケットの通信も含まれる。
+        # connect() 済みの UDP（QUIC など）を持つプロセスにだけ配分し、なければ不明のまま残す
+        rest_sent = max(0, total_sent - tcp_sent)
+        rest_recv = max(0, total_recv - tcp_recv)
+        udp_flows = {pid: {'connections': [conn for conn in data['connections']
+                                           if conn['proto'] == 'UDP' and conn['foreign'] != '*:*']}
+                     for pid, data in connections_by_pid.items()}
+        remainder = share_by_connections(rest_sent, rest_recv, udp_flows)
+        for pid, (sent, recv) in remainder.items():
+            stats = result.setdefault(pid, [0, 0])
+            stats[0] += sent
+            stats[1] += recv
+        self.unattributed = (rest_sent - sum(s for s, _ in remainder.values()),
+                             rest_recv - sum(r for _, r in remainder.values()))
+        return result
+
+
+class ProcIoSource(AccountingSource):
+    """Share the interface total by /proc/<pid>/io activity of processes with sockets"""
+
+    name = 'procio'
+    description = 'estimated from per-process I/O activity'
+
+    def __init__(self, proc_root='/proc'):
+        self.proc_root = proc_root
+        # pid -> (wchar, rchar)
+        self._previous = {}
+
+    def available(self):
+        return os.path.exists(os.path.join(self.proc_root, 'self', 'io'))
+
+    def read_io(self, pid):
+        """(wchar, rchar) of a process, or None if it cannot be read"""
+        values = {}
+        try:
+            with open(os.path.join(self.proc_root, str(pid), 'io'), 'r') as f:
+                for line in f:
+                    key, _, value = line.partition(':')
+                    values[key] = int(value)
+        except (OSError, ValueError):
+            return None
+        return values.get('wchar', 0), values.get('rchar', 0)
+
+    def sample(self, connections_by_pid, total_sent, total_recv):
+        current = {}
+        activity = {}
+        for pid, data in connections_by_pid.items():
+            if not data['connections']:
+                continue
+            io = self.read_io(pid)
+            if io is None:
+                continue
+            current[pid] = io
+            prev = self._previous.get(pid)
+            if prev is not None and io[0] >= prev[0] and io[1] >= prev[1]:
+                activity[pid] = (io[0] - prev[0], io[1] - prev[1])
+        self._previous = current
+
+        total_write = sum(w for w, _ in activity.values())
+        total_read = sum(r for _, r in activity.values())
+        if not total_write and not total_read:
+            # 初回や I/O が読めない場合は接続数で配分
+            return share_by_connections(total_sent, total_recv, connections_by_pid)
+        return {pid: [int(total_sent * w / total_write) if total_write else 0,
+                      int(total_recv * r / total_read) if total_read else 0]
+                for pid, (w, r) in activity.items()}
+
+
+class ProcessAccountingEngine:
+    """Run the first available source; a source that fails is dropped for good"""
+
+    def __init__(self, sources):
+        self.sources = [s for s in sources if s.available()]
+        if not self.sources:
+            self.sources = [ConnectionShareSource()]
+
+    @property
+    def source(self):
+        return self.sources[0]
+
+    @property
+    def unattributed(self):
+        """Bytes of the last interval the source could not attribute: (sent, recv)"""
+        return self.source.unattributed
+
+    def prime(self):
+        try:
+            self.source.prime()
+        except Exception as e:
+            self._drop(e)
+
+    def sample(self, connections_by_pid, total_sent, total_recv):
+        """Bytes per PID for the interval: {pid: [bytes_sent, bytes_recv]}"""
+        while True:
+            try:
+                return self.source.sample(connections_by_pid, total_sent, total_recv)
+            except Exception as e:
+                self._drop(e)
+
+    def _drop(self, error):
+        if len(self.sources) == 1:
+            raise error
+        print(f"Accounting source '{self.source.name}' failed, falling back: {error}")
+        self.sources.pop(0)
+
+
+SOURCES = {
+    'sockdiag': SockDiagSource,
+    'procio': ProcIoSource,
+    'connections': ConnectionShareSource,
+}
+
+
+def _create_source(name, owner_map):
+    if name == 'sockdiag':
+        return SockDiagSource(owner_map=owner_map)
+    return SOURCES[name]()
+
+
+def create_accounting_engine(backend='auto', owner_map=None):
+    """Create an engine ('auto' tries sockdiag, procio, then connections)
+
+    owner_map: SocketOwnerMap shared with the connection collector, if it has one
+    """
+    if backend == 'auto':
+        return ProcessAccountingEngine([_create_source(name, owner_map) for name in SOURCES])
+    if backend not in SOURCES:
+        raise ValueError(f"Unknown accounting source: {backend}")
+    return ProcessAccountingEngine([_create_source(backend, owner_map)])
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process metadata cache for NetworkMonitorV2
+Name / exe / cmdline are looked up once per process, keyed by
+(pid, create_time) so a reused PID is detected and refreshed
+"""
+
+from collections import namedtuple
+
+import psutil
+
+ProcessInfo = namedtuple('ProcessInfo', 'pid create_time name exe cmdline')
+
+
+class ProcessMetadataCache:
+    """(pid, create_time) -> ProcessInfo"""
+
+    def __init__(self):
+        self._entries = {}
+        self.lookups = 0  # name/exe/cmdline を取得し直した回数
+
+    def get(self, pid):
+        """Metadata of a running process (None if it is gone or inaccessible)"""
+        try:
+            proc = psutil.Process(pid)
+            create_time = proc.create_time()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            self._entries.pop(pid, None)
+            return None
+
+        info = self._entries.get(pid)
+        if info is not None and info.create_time == create_time:
+            return info
+
+        # 新しいプロセス、または PID が再利用された
+        try:
+            with proc.oneshot():
+                name = proc.name()
+                exe = self._optional(proc.exe)
+                cmdline = self._optional(proc.cmdline) or []
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            self._entries.pop(pid, None)
+            return None
+        self.lookups += 1
+        info = ProcessInfo(pid, create_time, name, exe, tuple(cmdline))
+        self._entries[pid] = info
+        return info
+
+    @staticmethod
+    def _optional(getter):
+        """exe / cmdline can be denied even when the name is readable"""
+        try:
+            return getter()
+        except psutil.AccessDenied:
+            return None
+
+    def cached(self, pid):
+        """Last known metadata without checking the process again (for display)"""
+        return self._entries.get(pid)
+
+    def prune(self, live_pids):
+        """Drop processes that are no longer being tracked"""
+        for pid in [pid for pid in self._entries if pid not in live_pids]:
+            del self._entries[pid]
+
+    def clear(self):
+        self._entries.clear()
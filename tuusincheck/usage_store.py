@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent time-series store for NetworkMonitorV2 samples
+Every sampling interval is appended as one row per process to SQLite
+(WAL mode, batched inserts). Process names are interned in a separate
+table, and range queries only touch the rows in the requested window.
+
+Samples are also rolled up per app into 1-minute, hourly and daily
+buckets (sum, max and p95 of the per-sample bytes) as they arrive.
+Each tier is kept for its own retention period, so the store stays
+bounded and long ranges are read from the coarse tiers.
+
+Usage (report from the command line):
+    python usage_store.py --from "2026-10-17 02:00" --to "2026-10-17 04:00"
+"""
+
+import argparse
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'network_usage.sqlite3')
+
+# 集計の段階（名前, 幅（秒））
+TIERS = (('minute', 60), ('hour', 3600), ('day', 86400))
+
+# 保存期間（秒、None は無期限）
+DEFAULT_RETENTION = {
+    'raw': 48 * 3600,
+    'minute': 14 * 86400,
+    'hour': 180 * 86400,
+    'day': None,
+}
+
+# 期限切れデータの削除間隔（秒）
+PRUNE_INTERVAL = 3600
+
+# p95 の近似に使う対数ヒストグラムの公比（誤差およそ5%）
+HISTOGRAM_GROWTH = 1.05
+_LOG_GROWTH = math.log(HISTOGRAM_GROWTH)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS names (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    ts          INTEGER NOT NULL,
+    pid         INTEGER NOT NULL,
+    name_id     INTEGER NOT NULL,
+    sent        INTEGER NOT NULL,
+    recv        INTEGER NOT NULL,
+    connections INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+CREATE TABLE IF NOT EXISTS rollups (
+    tier      INTEGER NOT NULL,
+    bucket    INTEGER NOT NULL,
+    name_id   INTEGER NOT NULL,
+    sent      INTEGER NOT NULL,
+    recv      INTEGER NOT NULL,
+    max_total INTEGER NOT NULL,
+    p95_total INTEGER NOT NULL,
+    samples   INTEGER NOT NULL,
+    PRIMARY KEY (tier, bucket, name_id)
+) WITHOUT ROWID;
+"""
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_retention(text):
+    """Parse 'raw=48h,minute=14d,hour=180d,day=forever' into a retention dict"""
+    retention = dict(DEFAULT_RETENTION)
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        tier, _, value = item.partition('=')
+        tier = tier.strip()
+        if tier not in retention:
+            raise ValueError(f"Unknown retention tier: {tier}")
+        value = value.strip().lower()
+        if value in ('forever', 'none', '0'):
+            retention[tier] = None
+        elif value[-1:] in _UNITS:
+            retention[tier] = int(float(value[:-1]) * _UNITS[value[-1]])
+        else:
+            retention[tier] = int(value)
+    return retention
+
+
+def bucket_start(ts, width):
+    """Start of the bucket containing ts (aligned to local time, so days start at midnight)"""
+    offset = time.localtime(ts).tm_gmtoff
+    return ts - (ts + offset) % width
+
+
+def _bin(value):
+    return 0 if value <= 0 else int(math.log(value) / _LOG_GROWTH) + 1
+
+
+def _bin_upper(index):
+    return 0 if index == 0 else int(HISTOGRAM_GROWTH ** index)
+
+
+class _Accumulator:
+    """Sum / max / approximate p95 of the per-sample bytes of one app in one bucket"""
+
+    __slots__ = ('sent', 'recv', 'max', 'samples', 'hist')
+
+    def __init__(self):
+        self.sent = self.recv = self.max = self.samples = 0
+        self.hist = {}
+
+    def add(self, sent, recv, weight=1):
+        total = sent + recv
+        self.sent += sent
+        self.recv += recv
+        self.samples += weight
+        if total > self.max:
+            self.max = total
+        index = _bin(total)
+        self.hist[index] = self.hist.get(index, 0) + weight
+
+    def seed(self, sent, recv, max_total, p95_total, samples):
+        """Resume a bucket written before a restart (its distribution is kept as the stored p95)"""
+        self.sent, self.recv, self.max, self.samples = sent, recv, max_total, samples
+        self.hist = {_bin(p95_total): samples} if samples else {}
+
+    def p95(self):
+        target = 0.95 * self.samples
+        cumulative = 0
+        for index in sorted(self.hist):
+            cumulative += self.hist[index]
+            if cumulative >= target:
+                return min(_bin_upper(index), self.max)
+        return self.max
+
+
+class UsageStore:
+    """Append-only per-process samples: (ts, pid, name_id, sent, recv, connections)"""
+
+    def __init__(self, path=DEFAULT_STORE_FILE, batch_size=500, flush_interval=60, retention=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+        self._names = dict(self._conn.execute("SELECT name, id FROM names"))
+        self._pending = []
+        self._last_flush = time.monotonic()
+        # 初回の削除は起動から PRUNE_INTERVAL 後（集計コマンドなど短時間の利用では削除しない）
+        self._last_prune = time.monotonic()
+
+        # 集計中のバケット: (幅, バケット開始, アプリ名) -> _Accumulator
+        self._open = {}
+        self._dirty = set()
+        self._latest_ts = 0
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM rollups LIMIT 1").fetchone() is None:
+                self._rollup_existing_samples()
+            else:
+                self._resume_open_buckets(int(time.time()))
+
+    def _intern(self, name):
+        """Name -> id (inserted on first use)"""
+        name_id = self._names.get(name)
+        if name_id is None:
+            name_id = self._conn.execute("INSERT INTO names (name) VALUES (?)", (name,)).lastrowid
+            self._names[name] = name_id
+        return name_id
+
+    def _add_to_rollups(self, ts, name, sent, recv):
+        """Add one app's bytes for one sample to every tier"""
+        for _, width in TIERS:
+            key = (width, bucket_start(ts, width), name)
+            acc = self._open.get(key)
+            if acc is None:
+                acc = self._open[key] = _Accumulator()
+            acc.add(sent, recv)
+            self._dirty.add(key)
+        if ts > self._latest_ts:
+            self._latest_ts = ts
+
+    def _write_rollups(self):
+        """Upsert the buckets changed since the last write and forget the closed ones"""
+        if self._dirty:
+            self._conn.executemany(
+                """INSERT OR REPLACE INTO rollups
+                   (tier, bucket, name_id, sent, recv, max_total, p95_total, samples)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(width, bucket, self._intern(name), acc.sent, acc.recv, acc.max, acc.p95(), acc.samples)
+                 for (width, bucket, name), acc in ((key, self._open[key]) for key in self._dirty)])
+            self._dirty.clear()
+        for key in [key for key in self._open if key[1] + key[0] <= self._latest_ts]:
+            del self._open[key]
+
+    def _resume_open_buckets(self, now):
+        """Reload the buckets that contain `now` so a restart continues them"""
+        for _, width in TIERS:
+            rows = self._conn.execute(
+                """SELECT names.name, sent, recv, max_total, p95_total, samples
+                   FROM rollups JOIN names ON names.id = rollups.name_id
+                   WHERE tier = ? AND bucket = ?""",
+                (width, bucket_start(now, width)))
+            for name, *values in rows:
+                acc = _Accumulator()
+                acc.seed(*values)
+                self._open[(width, bucket_start(now, width), name)] = acc
+
+    def _rollup_existing_samples(self):
+        """Build the rollups from samples recorded before rollups existed"""
+        rows = self._conn.execute(
+            """SELECT ts, names.name, SUM(sent), SUM(recv)
+               FROM samples JOIN names ON names.id = samples.name_id
+               GROUP BY ts, samples.name_id ORDER BY ts""")
+        with self._conn:
+            for count, (ts, name, sent, recv) in enumerate(rows, 1):
+                self._add_to_rollups(ts, name, sent, recv)
+                if count % 10000 == 0:
+                    self._write_rollups()
+            self._write_rollups()
+
+    def append(self, timestamp, process_stats):
+        """Buffer one interval of process_stats (pid -> stats dict); flush when the batch is full"""
+        ts = int(timestamp)
+        rows = [(ts, pid, stats['name'], stats['bytes_sent'], stats['bytes_recv'],
+                 stats.get('connection_count', 0))
+                for pid, stats in process_stats.items()
+                if stats['bytes_sent'] or stats['bytes_recv']]
+
+        # 同じアプリの複数プロセスはまとめて集計する
+        by_name = {}
+        for _, _, name, sent, recv, _ in rows:
+            totals = by_name.setdefault(name, [0, 0])
+            totals[0] += sent
+            totals[1] += recv
+
+        with self._lock:
+            self._pending.extend(rows)
+            for name, (sent, recv) in by_name.items():
+                self._add_to_rollups(ts, name, sent, recv)
+            due = (len(self._pending) >= self.batch_size or
+                   time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows and changed rollups in one transaction"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+            with self._conn:
+                if rows:
+                    self._conn.executemany(
+                        "INSERT INTO samples (ts, pid, name_id, sent, recv, connections) VALUES (?, ?, ?, ?, ?, ?)",
+                        [(ts, pid, self._intern(name), sent, recv, conns)
+                         for ts, pid, name, sent, recv, conns in rows])
+                self._write_rollups()
+                if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                    self._prune(int(time.time()))
+
+    def _prune(self, now):
+        """Delete rows older than each tier's retention"""
+        self._last_prune = time.monotonic()
+        if self.retention['raw'] is not None:
+            self._conn.execute("DELETE FROM samples WHERE ts < ?", (now - self.retention['raw'],))
+        for tier, width in TIERS:
+            if self.retention[tier] is not None:
+                self._conn.execute("DELETE FROM rollups WHERE tier = ? AND bucket < ?",
+                                   (width, now - self.retention[tier]))
+
+    def _covers(self, tier, start):
+        """Whether the tier still holds data from start"""
+        keep = self.retention[tier]
+        return keep is None or start >= time.time() - keep
+
+    def top_apps(self, start, end, limit=10):
+        """Apps ranked by total bytes in [start, end): [(name, sent, recv, total)]
+
+        Raw samples are used while they are retained; older ranges are read
+        from the finest rollup tier that covers them (rounded to its buckets).
+        """
+        self.flush()
+        if self._covers('raw', start):
+            query = """SELECT names.name, SUM(sent), SUM(recv), SUM(sent + recv) AS total
+                       FROM samples JOIN names ON names.id = samples.name_id
+                       WHERE ts >= ? AND ts < ?
+                       GROUP BY samples.name_id ORDER BY total DESC LIMIT ?"""
+            params = (int(start), int(end), limit)
+        else:
+            width = next((w for tier, w in TIERS if self._covers(tier, start)), TIERS[-1][1])
+            query = """SELECT names.name, SUM(sent), SUM(recv), SUM(sent + recv) AS total
+                       FROM rollups JOIN names ON names.id = rollups.name_id
+                       WHERE tier = ? AND bucket > ? AND bucket < ?
+                       GROUP BY rollups.name_id ORDER BY total DESC LIMIT ?"""
+            params = (width, int(start) - width, int(end), limit)
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def series(self, name, start, end):
+        """Raw samples of one app in [start, end): [(ts, pid, sent, recv, connections)]"""
+        self.flush()
+        with self._lock:
+            return self._conn.execute(
+                """SELECT ts, pid, sent, recv, connections FROM samples
+                   WHERE ts >= ? AND ts < ? AND name_id = (SELECT id FROM names WHERE name = ?)
+                   ORDER BY ts""",
+                (int(start), int(end), name)).fetchall()
+
+    def history(self, name, start, end, max_points=1500):
+        """One app's usage for charts: [(bucket, sent, recv, max_total, p95_total)]
+
+        Uses the finest tier that covers start with at most max_points buckets.
+        """
+        self.flush()
+        candidates = [(tier, width) for tier, width in TIERS if self._covers(tier, start)] or [TIERS[-1]]
+        width = next((w for _, w in candidates if (end - start) / w <= max_points), candidates[-1][1])
+        with self._lock:
+            return self._conn.execute(
+                """SELECT bucket, sent, recv, max_total, p95_total FROM rollups
+                   WHERE tier = ? AND bucket > ? AND bucket < ?
+                     AND name_id = (SELECT id FROM names WHERE name = ?)
+                   ORDER BY bucket""",
+                (width, int(start) - width, int(end), name)).fetchall()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+def format_bytes(bytes_value):
+    """Convert bytes to human readable format"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if bytes_value < 1024.0:
+            return f"{bytes_value:.2f} {unit}"
+        bytes_value /= 1024.0
+    return f"{bytes_value:.2f} PB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Top apps by network usage in a time range')
+    parser.add_argument('--store', default=DEFAULT_STORE_FILE, help='Store file')
+    parser.add_argument('--from', dest='start', required=True, help='Start, e.g. "2026-10-17 02:00"')
+    parser.add_argument('--to', dest='end', required=True, help='End (exclusive)')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--retention', default='', help='e.g. "raw=48h,minute=14d,hour=180d,day=forever"')
+    args = parser.parse_args()
+
+    start = datetime.fromisoformat(args.start).timestamp()
+    end = datetime.fromisoformat(args.end).timestamp()
+    store = UsageStore(args.store, retention=parse_retention(args.retention))
+    try:
+        rows = store.top_apps(start, end, args.limit)
+    finally:
+        store.close()
+
+    print(f"Top apps {args.start} - {args.end}")
+    for i, (name, sent, recv, total) in enumerate(rows, 1):
+        print(f"{i:>2}. {name:<25} Sent: {format_bytes(sent):>12} | "
+              f"Recv: {format_bytes(recv):>12} | Total: {format_bytes(total):>12}")
+
+
+if __name__ == '__main__':
+    main()